@@ -6,52 +6,73 @@ Script to find shortest find from a road network by using A* algortihm.
     Date        : Jun 2019
 """
 import os
-from pprint import pprint
-
-from osgeo import ogr
-from osgeo import osr
-import networkx as nx
-import matplotlib.pyplot as plt
+import time
+import logging
 
 from utils import (
     calculate_distance, 
-    get_nodes, 
-    pretty_node, 
-    print_dictionary, 
-    print_node, 
     nodes_from_path,
-    get_spatial_reference,
-    create_path_layer,
-    graph_summary
+    get_logger,
+    log_graph_summary,
+    log_node,
+    enable_verbose_output
 )
+from graph_store import get_graph, load_graph
+from graph_index import get_graph_index
+from route_result import RouteResult
+from search import shortest_path_search
+from leg_cache import get_leg_cache
+from instrumentation import get_metrics, phase
+
+logger = get_logger(__name__)
 
-def shortest_path_a_star(start_node, end_node, input_data_path, output_file):
+def shortest_path_a_star(start_node, end_node, input_data_path, output_file, heuristic=calculate_distance, bidirectional=False, leg_cache=None):
     """Main function for A* shortest path
         
         `start_node` and `end_node` are ('key', 'value') format.
-        `input_data_path` is a path to directory with nodes and edges layer.
+        `input_data_path` is a path to directory with nodes and edges layer,
+            or a graph loaded with `graph_store.load_graph`.
         `output_file` is a path to the output shape file.
+        `heuristic` is the A* heuristic function(u, v), e.g. `alt.ALTTables.heuristic()`.
+        `bidirectional` uses a bidirectional A* search.
+        `leg_cache` is a `leg_cache.LegCache` of paths, the shared one if it is enabled by default.
+
+        Return a `RouteResult`.
     """
-    # Read graph
-    G = nx.Graph(nx.read_shp(input_data_path, strict=False, geom_attrs=True)) # Read and convert to Graph
-    graph_summary(G)
+    metrics = get_metrics()
+    # Read graph (only once per dataset)
+    with phase(metrics, 'graph_load'):
+        G = get_graph(input_data_path)
+    log_graph_summary(logger, G)
+    start_time = time.perf_counter()
 
     # Get start and end node
-    start = get_nodes(G, start_node[0], start_node[1])[0]
-    end = get_nodes(G, end_node[0], end_node[1])[0]
-    print("Start node:")
-    print_node(G, start)
-    print("End node:")
-    print_node(G, end)
+    with phase(metrics, 'endpoint_lookup'):
+        index = get_graph_index(G)
+        start = index.get_node(start_node[0], start_node[1])
+        end = index.get_node(end_node[0], end_node[1])
+    logger.debug('Start node:')
+    log_node(logger, G, start)
+    logger.debug('End node:')
+    log_node(logger, G, end)
 
-    # Find shortest path
-    shortest_path = nx.astar_path(G, start, end, heuristic=calculate_distance, weight='length')
-    fids = nodes_from_path(G, shortest_path, key=start_node[0])
-    print('Shortest path: ' + ' - '.join(['%d' % fid for fid in fids]))
-    shortest_path_length = nx.astar_path_length(G, start, end, heuristic=calculate_distance, weight='length')
-    print('Shortest path length: %f' % shortest_path_length)
+    # Find shortest path and its length with a single search
+    with phase(metrics, 'leg'):
+        shortest_path, shortest_path_length, expanded = shortest_path_search(
+            G, start, end, heuristic=heuristic, weight='length', bidirectional=bidirectional,
+            leg_cache=get_leg_cache(leg_cache))
+    if logger.isEnabledFor(logging.DEBUG):
+        fids = nodes_from_path(G, shortest_path, key=start_node[0])
+        logger.debug('Shortest path: %s', ' - '.join(['%d' % fid for fid in fids]))
+    logger.debug('Shortest path length: %f', shortest_path_length)
 
-    return shortest_path
+    return RouteResult(
+        shortest_path,
+        shortest_path_length,
+        expanded=expanded,
+        elapsed=time.perf_counter() - start_time,
+        algorithm=shortest_path_a_star.name
+    )
 
     # Skip this writing file, move to the wrapper
     # # Write result to a shapefile
@@ -67,6 +88,8 @@ shortest_path_a_star.name = 'a_star'
 
 if __name__ == "__main__":
     print('Start')
+    # Research run, print the details of every query
+    enable_verbose_output()
 
     id_field = 'nodeID'
     input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/topic_data'
@@ -88,10 +111,12 @@ if __name__ == "__main__":
             'end': 3102
         },
     ]
+    # Read the graph once for all route pairs
+    G = load_graph(input_data_path)
     for pair in route_pairs:
         start_node = (id_field, pair['start'])
         end_node = (id_field, pair['end'])
         output_file = os.path.join(base_output_file, '%s.shp' % pair['name'])
-        shortest_path_a_star(start_node, end_node, input_data_path, output_file)
+        shortest_path_a_star(start_node, end_node, G, output_file)
     
     print('fin')
\ No newline at end of file
@@ -6,134 +6,203 @@ Script to find shortest find from a road network by using A* algortihm.
     Date        : Jun 2019
 """
 import os
-from pprint import pprint
-import operator
-from copy import deepcopy
+import time
+import logging
 
-from osgeo import ogr, osr
-
-import networkx as nx
-import matplotlib.pyplot as plt
+import numpy as np
 
 from utils import (
     calculate_distance, 
-    get_nodes, 
-    pretty_node, 
-    print_dictionary, 
-    print_node, 
-    nodes_from_path,
-    get_spatial_reference,
-    create_path_layer,
-    graph_summary
+    get_logger,
+    log_graph_summary,
+    log_node,
+    enable_verbose_output,
+    remove_loops
 )
+from graph_store import get_graph, load_graph
+from graph_index import get_graph_index
+from route_result import RouteResult
+from search import shortest_path_search, path_length
+from multi_leg import multi_leg_search
+from leg_cache import get_leg_cache
+from landmark_matrix import get_landmark_matrix
+from instrumentation import get_metrics, phase
+
+logger = get_logger(__name__)
+
+# Keep the landmarks inside the ellipse with foci at start and end where
+# `start to landmark + landmark to end <= LANDMARK_DETOUR_FACTOR * start to end`.
+# Every landmark eligible from the start node is inside the ellipse of factor 2.
+LANDMARK_DETOUR_FACTOR = 2.0
+
+def corridor_landmarks(start, end, index, detour_factor=LANDMARK_DETOUR_FACTOR, corridor_buffer=None):
+    """Return the landmark nodes and coordinates of `index` in the corridor between `start` and `end`
+
+        The corridor is the ellipse of `detour_factor`, or the buffer of `corridor_buffer`
+        distance around the start to end segment if it is set. The candidates come
+        from the spatial index of the landmarks and keep the order of `index.landmark_nodes`.
+    """
+    start_end_distance = calculate_distance(start, end)
+    middle = ((start[0] + end[0]) / 2.0, (start[1] + end[1]) / 2.0)
+    if corridor_buffer is None:
+        # The ellipse is inside the circle of its semi-major axis
+        radius = detour_factor * start_end_distance / 2.0
+    else:
+        radius = start_end_distance / 2.0 + corridor_buffer
+    candidates = np.sort(index.landmark_snapper.query_radius([middle], radius)[0])
+    coordinates = index.landmark_coordinates[candidates]
+
+    x = coordinates[:, 0]
+    y = coordinates[:, 1]
+    start_distances = np.sqrt((x - start[0]) ** 2 + (y - start[1]) ** 2)
+    if corridor_buffer is None:
+        end_distances = np.sqrt((x - end[0]) ** 2 + (y - end[1]) ** 2)
+        inside = start_distances + end_distances <= detour_factor * start_end_distance
+    elif start_end_distance == 0:
+        inside = start_distances <= corridor_buffer
+    else:
+        # Distance to the start to end segment
+        dx = (end[0] - start[0]) / start_end_distance
+        dy = (end[1] - start[1]) / start_end_distance
+        along = np.clip((x - start[0]) * dx + (y - start[1]) * dy, 0, start_end_distance)
+        inside = np.sqrt((x - start[0] - along * dx) ** 2 + (y - start[1] - along * dy) ** 2) <= corridor_buffer
 
-def shortest_path_a_star(start_node, end_node, input_data_path, output_file):
+    candidates = candidates[inside]
+    return [index.landmark_nodes[i] for i in candidates], coordinates[inside]
+
+def select_transit_landmarks(start, end, landmark_nodes, landmark_coordinates):
+    """Return the path from `start` through the transit landmarks (without `end`)
+
+        From the current node, the next transit landmark is the unvisited landmark
+        with the smallest `current to landmark + landmark to end` distance, among the
+        landmarks that are not farther from the current node nor from the end than
+        the current node is from the end. The distances to every landmark are
+        computed at once with `landmark_coordinates` ([L, 2] array of `landmark_nodes`).
+    """
+    landmark_x = landmark_coordinates[:, 0]
+    landmark_y = landmark_coordinates[:, 1]
+    # The landmark to end distances do not change between iterations
+    landmark_end_distances = np.sqrt((landmark_x - end[0]) ** 2 + (landmark_y - end[1]) ** 2)
+    visited = np.zeros(len(landmark_nodes), dtype=bool)
+
+    current_node = start
+    path = [start]
+    while True:
+        current_distance_to_end = calculate_distance(current_node, end)
+        current_distances = np.sqrt((landmark_x - current_node[0]) ** 2 + (landmark_y - current_node[1]) ** 2)
+        # compare the `current_node to end distance` with the `landmark to end distance`
+        # and the `current_node to landmark distance`
+        candidates = ~visited
+        candidates &= landmark_end_distances <= current_distance_to_end
+        candidates &= current_distances <= current_distance_to_end
+        # No more landmarks, it means finish
+        if not candidates.any():
+            break
+        # argmin keeps the first landmark among equal distances
+        distances = np.where(candidates, current_distances + landmark_end_distances, np.inf)
+        best = int(np.argmin(distances))
+        visited[best] = True
+        current_node = landmark_nodes[best]
+        path.append(current_node)
+    return path
+
+def shortest_path_a_star(start_node, end_node, input_data_path, output_file, detour_factor=LANDMARK_DETOUR_FACTOR, corridor_buffer=None, bidirectional=False, shared_legs=False, leg_cache=None, landmark_matrix=None):
     """Main function for A* shortest path
         
         `start_node` and `end_node` are ('key', 'value') format.
-        `input_data_path` is a path to directory with nodes and edges layer.
+        `input_data_path` is a path to directory with nodes and edges layer,
+            or a graph loaded with `graph_store.load_graph`.
         `output_file` is a path to the output shape file.
+        `detour_factor` and `corridor_buffer` set the corridor of the landmarks, see `corridor_landmarks`.
+        `bidirectional` uses a bidirectional A* search for each leg.
+        `shared_legs` shares one search between two consecutive legs, see `multi_leg`.
+        `leg_cache` is a `leg_cache.LegCache` of legs, the shared one if it is enabled by default.
+        `landmark_matrix` is a `landmark_matrix.LandmarkMatrix` (or True for the one of the graph)
+            to read the legs between two transit landmarks from it, only the first and
+            last legs are searched (not with `shared_legs`).
+
+        Return a `RouteResult`.
     """
-    # Read graph
-    G = nx.Graph(nx.read_shp(input_data_path, strict=False, geom_attrs=True)) # Read and convert to Graph
-    graph_summary(G)
+    metrics = get_metrics()
+    # Read graph (only once per dataset)
+    with phase(metrics, 'graph_load'):
+        G = get_graph(input_data_path)
+    log_graph_summary(logger, G)
+    start_time = time.perf_counter()
+    leg_cache = get_leg_cache(leg_cache)
 
     # Get start and end node
-    start = get_nodes(G, start_node[0], start_node[1])[0]
-    end = get_nodes(G, end_node[0], end_node[1])[0]
-    print("Start node:")
-    print_node(G, start)
-    print("End node:")
-    print_node(G, end)
-
-    # Get landmark node
-    landmark_nodes = get_nodes(G, 'landmark', 1)
-    # for landmark_node in landmark_nodes:
-    #     print(G.node[landmark_node]['nodeID'], G.node[landmark_node]['landmark'])
-
-    # Remove landmark that has bigger distance than the starting point to end
-    #TODO: ????
-
-    # Get transit node
-    current_node = start
-    unvisited_landmarks = deepcopy(landmark_nodes)
-    path = [start]
-    finish = False
-    while not finish:
-        current_distance_to_end = calculate_distance(current_node, end)
+    with phase(metrics, 'endpoint_lookup'):
+        index = get_graph_index(G)
+        start = index.get_node(start_node[0], start_node[1])
+        end = index.get_node(end_node[0], end_node[1])
+    logger.debug('Start node:')
+    log_node(logger, G, start)
+    logger.debug('End node:')
+    log_node(logger, G, end)
 
-        # order distance
-        # get distance for all unvisited landmarks from the current node
-        # landmark_distance_dict = {node: calculate_distance(current_node, node) for node in unvisited_landmarks}
-        landmark_distance_dict = {node: calculate_distance(current_node, node) + calculate_distance(node, end) for node in unvisited_landmarks}
-        # sort the distance
-        sorted_landmark_distance_dict = sorted(landmark_distance_dict.items(), key=operator.itemgetter(1))
-        # No more landmarks, it means finish
-        if len(sorted_landmark_distance_dict) == 0:
-            finish = True
-        for landmark_distance in sorted_landmark_distance_dict:
-            # get landmark to end distance
-            landmark_end_distance = calculate_distance(landmark_distance[0], end)
-            # compare the `current_node to end distance` with the `landmark to end distance`
-            # TODO: ????
-            if current_distance_to_end < landmark_end_distance or calculate_distance(current_node, landmark_distance[0]) > current_distance_to_end:
-                # the current node distance 
-                finish = True
-                continue
-            else:
-                path.append(landmark_distance[0])
-                current_node = landmark_distance[0]
-                unvisited_landmarks.remove(current_node)
-                finish = False
-                break
-    print('Path')
-    path.append(end)
-    for landmark_node in path:
-        print(G.node[landmark_node]['nodeID'], G.node[landmark_node]['landmark'], landmark_node)
+    with phase(metrics, 'landmark_selection'):
+        # Get landmark node, without the landmarks outside the corridor between start and end
+        landmark_nodes, landmark_coordinates = corridor_landmarks(start, end, index, detour_factor, corridor_buffer)
+        # for landmark_node in landmark_nodes:
+        #     print(G.node[landmark_node]['nodeID'], G.node[landmark_node]['landmark'])
+
+        # Get transit node
+        path = select_transit_landmarks(start, end, landmark_nodes, landmark_coordinates)
+        path.append(end)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Path')
+        for landmark_node in path:
+            logger.debug('%s %s %s', G.node[landmark_node]['nodeID'], G.node[landmark_node]['landmark'], landmark_node)
     
-    # Build full path from the path using A*
-    full_path = []
-    i = 0
-    for i in range(len(path) - 1):
-        shortest_landmark_path = nx.astar_path(G, path[i], path[i+1], heuristic=calculate_distance, weight='length')
-        full_path.extend(shortest_landmark_path[:-1])
-
-    # Adding end node
-    full_path.append(end)
+    if landmark_matrix is True:
+        landmark_matrix = get_landmark_matrix(G)
+    if shared_legs and landmark_matrix is None:
+        # Build full path from the path with one search for every two legs
+        with phase(metrics, 'shared_legs'):
+            full_path, _, expanded, legs = multi_leg_search(G, path, weight='length')
+        if metrics is not None:
+            metrics.count('nodes_settled', expanded)
+    else:
+        # Build full path from the path using A*
+        full_path = []
+        expanded = 0
+        legs = []
+        i = 0
+        for i in range(len(path) - 1):
+            with phase(metrics, 'leg'):
+                # A leg between two landmarks is read from the matrix, without search
+                leg = landmark_matrix.landmark_leg(path[i], path[i+1]) if landmark_matrix is not None else None
+                if leg is not None:
+                    shortest_landmark_path, leg_length = leg
+                    leg_expanded = 0
+                else:
+                    shortest_landmark_path, leg_length, leg_expanded = shortest_path_search(
+                        G, path[i], path[i+1], heuristic=calculate_distance, weight='length', bidirectional=bidirectional,
+                        leg_cache=leg_cache)
+            full_path.extend(shortest_landmark_path[:-1])
+            expanded += leg_expanded
+            legs.append({'start': path[i], 'end': path[i+1], 'length': leg_length, 'expanded': leg_expanded})
+
+        # Adding end node
+        full_path.append(end)
     # print('Full path')
     # for node in full_path:
     #     print(G.node[node]['nodeID'], G.node[node]['landmark'], node)
 
     # Clean path from duplicated node, this algorithm work since the path is continue
-    if len(full_path) != len(set(full_path)):
-        unduplicate_path = []
-        skip = False
-        current_node = None
-        for node in full_path:
-            if not skip:
-                if full_path.count(node) == 1:
-                    # Always add node with single occurence
-                    unduplicate_path.append(node)
-                else:
-                    # Add the first node that has more than one occurence
-                    unduplicate_path.append(node)
-                    # Mark skip as true for the next nodes
-                    skip = True
-                    # Store the first duplicate node
-                    current_node = node
-            else:
-                if node == current_node:
-                    # Found another current_node
-                    # Remove the skip flag
-                    skip = False
-                    current_node = None
-                else:
-                    # Always skip until found another current_node
-                    pass
-
-        full_path = unduplicate_path
+    with phase(metrics, 'dedup'):
+        if len(full_path) != len(set(full_path)):
+            full_path = remove_loops(full_path)
 
-    return full_path
+    return RouteResult(
+        full_path,
+        path_length(G, full_path, weight='length'),
+        expanded=expanded,
+        elapsed=time.perf_counter() - start_time,
+        algorithm=shortest_path_a_star.name,
+        legs=legs
+    )
 
     # Skip this writing file, move to the wrapper
     # # Write result to a shapefile
@@ -149,6 +218,8 @@ shortest_path_a_star.name = 'a_star_landmark'
 
 if __name__ == "__main__":
     print('Start')
+    # Research run, print the details of every query
+    enable_verbose_output()
 
     from qgis.core import QgsApplication, QgsVectorLayer, QgsPointXY
     
@@ -176,10 +247,12 @@ if __name__ == "__main__":
             'end': 3102
         },
     ]
+    # Read the graph once for all route pairs
+    G = load_graph(input_data_path)
     for pair in route_pairs:
         start_node = (id_field, pair['start'])
         end_node = (id_field, pair['end'])
         output_file = os.path.join(base_output_file, 'landmark_%s.shp' % pair['name'])
-        shortest_path_a_star(start_node, end_node, input_data_path, output_file)
+        shortest_path_a_star(start_node, end_node, G, output_file)
     
     print('fin')
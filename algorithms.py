@@ -0,0 +1,31 @@
+"""
+Registry of the routing algorithms, to select an algorithm by name.
+
+Every algorithm has the signature of `a_star.shortest_path_a_star` and a
+`name` attribute.
+"""
+from a_star import shortest_path_a_star as a_star_algorithm
+from a_star_landmark import shortest_path_a_star as a_star_landmark_algorithm
+from csr_a_star import shortest_path_a_star as csr_a_star_algorithm
+from alt import shortest_path_a_star as a_star_alt_algorithm
+from contraction_hierarchy import shortest_path_a_star as contraction_hierarchy_algorithm
+
+ALGORITHMS = {
+    algorithm.name: algorithm for algorithm in [
+        a_star_algorithm,
+        a_star_landmark_algorithm,
+        csr_a_star_algorithm,
+        a_star_alt_algorithm,
+        contraction_hierarchy_algorithm,
+    ]
+}
+
+
+def get_algorithm(algorithm):
+    """Return the algorithm function of `algorithm`, either a name or the function"""
+    if callable(algorithm):
+        return algorithm
+    try:
+        return ALGORITHMS[algorithm]
+    except KeyError:
+        raise ValueError('Unknown algorithm %s, use one of %s' % (algorithm, ', '.join(sorted(ALGORITHMS))))
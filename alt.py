@@ -0,0 +1,192 @@
+"""
+ALT (A*, landmarks and triangle inequality) heuristic for A* shortest path.
+
+K reference nodes are chosen once, and the network distance from each of them
+to every node is stored as a float32 [K, N] matrix next to the network (in the
+`alt` directory of the dataset). For an undirected graph, the triangle
+inequality gives the lower bound
+
+    d(u, v) >= |d(r, u) - d(r, v)|  for every reference node r
+
+which is usually much tighter than the Euclidean distance, so A* expands far
+fewer nodes.
+"""
+import json
+import os
+
+import numpy as np
+import networkx as nx
+
+from utils import calculate_distance
+
+ALT_DIRECTORY = 'alt'
+NUMBER_OF_REFERENCES = 16
+
+
+def select_reference_nodes(G, number_of_references=NUMBER_OF_REFERENCES, method='farthest', weight='length'):
+    """Return the reference nodes of `G` and their distance to every node (list of dict).
+
+        `method` is `farthest` to pick each reference as the node farthest from the
+        references already picked, or `landmark` to pick them (the same way) among the
+        nodes flagged as landmark.
+    """
+    nodes = sorted(G.nodes)
+    if method == 'landmark':
+        from graph_index import get_graph_index
+        candidates = sorted(get_graph_index(G).landmark_nodes)
+    elif method == 'farthest':
+        candidates = nodes
+    else:
+        raise ValueError('Unknown reference node method %s' % method)
+    if not candidates:
+        raise ValueError('No candidate reference nodes in the graph')
+
+    # Start from the candidate farthest from an arbitrary node
+    distances = nx.single_source_dijkstra_path_length(G, candidates[0], weight=weight)
+    closest_reference = {node: distances.get(node, float('inf')) for node in candidates}
+    references = []
+    reference_distances = []
+    for _ in range(min(number_of_references, len(candidates))):
+        reference = max(candidates, key=lambda node: closest_reference[node])
+        if reference in references:
+            break
+        distances = nx.single_source_dijkstra_path_length(G, reference, weight=weight)
+        references.append(reference)
+        reference_distances.append(distances)
+        for node in candidates:
+            closest_reference[node] = min(closest_reference[node], distances.get(node, float('inf')))
+    return references, reference_distances
+
+
+class ALTTables(object):
+    """Distance from each reference node to each node, see the module docstring."""
+
+    def __init__(self, nodes, references, distances):
+        # `nodes` is a [N, 2] array of node keys, `references` a [K, 2] array
+        self.nodes = np.asarray(nodes, dtype=np.float64).reshape(-1, 2)
+        self.references = np.asarray(references, dtype=np.float64).reshape(-1, 2)
+        self.distances = distances
+        self.node_index = {(x, y): i for i, (x, y) in enumerate(self.nodes.tolist())}
+        finite = distances[np.isfinite(distances)]
+        # float32 rounding may overestimate a difference by a few ulps, keep the bound admissible
+        self.tolerance = float(finite.max()) * 2 ** -21 if finite.size else 0.0
+        self._node_distances = None
+
+    @property
+    def node_distances(self):
+        """The distances as a contiguous [N, K] array (a row per node), built once and shared by the heuristics"""
+        if self._node_distances is None:
+            self._node_distances = np.ascontiguousarray(self.distances.T)
+        return self._node_distances
+
+    @classmethod
+    def build(cls, G, number_of_references=NUMBER_OF_REFERENCES, method='farthest', weight='length'):
+        """Choose the reference nodes of `G` and compute their distance tables"""
+        nodes = sorted(G.nodes)
+        references, reference_distances = select_reference_nodes(G, number_of_references, method, weight)
+        # Unreachable nodes are NaN, ignored by the heuristic
+        distances = np.full((len(references), len(nodes)), np.nan, dtype=np.float32)
+        for k, node_distances in enumerate(reference_distances):
+            for i, node in enumerate(nodes):
+                if node in node_distances:
+                    distances[k, i] = node_distances[node]
+        return cls(nodes, references, distances)
+
+    def save(self, output_path, dataset_signature=None):
+        """Write the tables as `.npy` files in the directory `output_path`"""
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        np.save(os.path.join(output_path, 'nodes.npy'), self.nodes)
+        np.save(os.path.join(output_path, 'references.npy'), self.references)
+        np.save(os.path.join(output_path, 'distances.npy'), self.distances)
+        with open(os.path.join(output_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'number_of_references': len(self.references),
+                'number_of_nodes': len(self.nodes),
+                'dataset_signature': dataset_signature,
+            }, f)
+        return output_path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load the tables in the directory `path`"""
+        return cls(
+            np.load(os.path.join(path, 'nodes.npy')),
+            np.load(os.path.join(path, 'references.npy')),
+            np.load(os.path.join(path, 'distances.npy'), mmap_mode=mmap_mode),
+        )
+
+    def heuristic(self):
+        """Return an ALT heuristic function(u, v) for `nx.astar_path` or `search.astar_search`"""
+        return ALTHeuristic(self)
+
+
+class ALTHeuristic(object):
+    """Maximum of the Euclidean and the ALT lower bounds of the distance from u to v."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.node_index = tables.node_index
+        self.distances = tables.node_distances
+        self.tolerance = tables.tolerance
+        # Distances of the targets of the current search (two for a bidirectional search)
+        self._targets = {}
+
+    def __call__(self, u, v):
+        target_distances = self._targets.get(v)
+        if target_distances is None:
+            if len(self._targets) >= 2:
+                self._targets.clear()
+            target_distances = self._targets[v] = self.distances[self.node_index[v]]
+        distance = calculate_distance(u, v)
+        # NaN (unreachable from a reference node) is ignored by fmax
+        bound = float(np.fmax.reduce(np.abs(self.distances[self.node_index[u]] - target_distances))) - self.tolerance
+        if bound > distance:
+            return bound
+        return distance
+
+
+def get_alt_tables(G, number_of_references=NUMBER_OF_REFERENCES, method='farthest'):
+    """Return the ALT tables of `G`, loaded from its dataset or built (and saved) once"""
+    from graph_index import graph_signature
+    from graph_store import derived_directory, write_derived_directory
+    signature = graph_signature(G)
+    cached = G.graph.get('alt')
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    tables = None
+    # Tables on disk are only valid for the unchanged dataset
+    path, source_signature = derived_directory(G, ALT_DIRECTORY)
+    if path and os.path.exists(os.path.join(path, 'meta.json')):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('dataset_signature') == source_signature:
+            tables = ALTTables.load(path)
+    if tables is None:
+        tables = ALTTables.build(G, number_of_references, method)
+        if path:
+            write_derived_directory(path, lambda directory: tables.save(directory, source_signature))
+    G.graph['alt'] = (signature, tables)
+    return tables
+
+
+def shortest_path_a_star(start_node, end_node, input_data_path, output_file):
+    """A* shortest path with the ALT heuristic, see `a_star.shortest_path_a_star`"""
+    from a_star import shortest_path_a_star as a_star_algorithm
+    from graph_store import get_graph
+    G = get_graph(input_data_path)
+    heuristic = get_alt_tables(G).heuristic()
+    result = a_star_algorithm(start_node, end_node, G, output_file, heuristic=heuristic)
+    result.algorithm = shortest_path_a_star.name
+    return result
+
+shortest_path_a_star.name = 'a_star_alt'
+
+if __name__ == "__main__":
+    from graph_store import load_graph
+
+    input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/topic_data'
+    G = load_graph(input_data_path)
+    tables = get_alt_tables(G)
+    print('Number of reference nodes: %s' % len(tables.references))
+    print('fin')
@@ -0,0 +1,149 @@
+"""
+Batch routing of many origin-destination pairs with a process pool.
+
+Every worker loads the graph once in its initializer. A compiled graph
+directory (see `compiled_graph`) is memory-mapped, so the workers share its
+pages; a graph already loaded in this process is inherited by the forked
+workers without being copied.
+"""
+import multiprocessing
+import os
+
+import networkx as nx
+
+from algorithms import get_algorithm
+from compiled_graph import META_FILE, CompiledGraph, load_compiled_graph
+from csr_a_star import CSRAStar
+from leg_cache import LegCache, enable_leg_cache, shared_leg_cache
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+# Graph and algorithm of the worker process
+_worker = {}
+# Errors of a single route (no path, unknown node), the other errors stop the batch
+ROUTE_ERRORS = (nx.NetworkXNoPath, KeyError)
+# Algorithms that route over a compiled graph
+COMPILED_ALGORITHMS = ('csr_a_star',)
+
+
+def load_input_data(input_data):
+    """Return the graph of `input_data`: a compiled graph directory, a dataset path or a graph"""
+    if isinstance(input_data, str) and os.path.exists(os.path.join(input_data, META_FILE)):
+        return load_compiled_graph(input_data)
+    if isinstance(input_data, str):
+        from graph_store import load_graph
+        return load_graph(input_data)
+    return input_data
+
+
+def is_compiled(input_data):
+    """Return True if `input_data` is a compiled graph, its A* engine or a compiled graph directory"""
+    if isinstance(input_data, str):
+        return os.path.exists(os.path.join(input_data, META_FILE))
+    return isinstance(input_data, (CompiledGraph, CSRAStar))
+
+
+def _worker_state(input_data, algorithm):
+    """Return the graph and the algorithm of a worker"""
+    return {'graph': load_input_data(input_data), 'algorithm': get_algorithm(algorithm)}
+
+
+def _init_worker(input_data, algorithm, leg_cache_entries=None):
+    """Load the graph and the algorithm once per worker process"""
+    _worker.update(_worker_state(input_data, algorithm))
+    if leg_cache_entries:
+        enable_leg_cache(max_entries=leg_cache_entries)
+
+
+def _node(node, node_id_attribute):
+    """Return `node` in ('key', 'value') format"""
+    if isinstance(node, tuple):
+        return node
+    return (node_id_attribute, node)
+
+
+def _route(job, worker=None):
+    """Route a single (index, (start_node, end_node), node_id_attribute) job with the `worker` state"""
+    if worker is None:
+        worker = _worker
+    index, (start_node, end_node), node_id_attribute = job
+    try:
+        result = worker['algorithm'](
+            _node(start_node, node_id_attribute), _node(end_node, node_id_attribute), worker['graph'], None)
+    except ROUTE_ERRORS as e:
+        logger.warning('Route %s failed: %s', index, e)
+        result = None
+    return index, result
+
+
+def route_many(pairs, algorithm, input_data, workers=None, ordered=True, chunksize=8, node_id_attribute='nodeID', leg_cache_entries=None):
+    """Route every (start_node, end_node) of `pairs` and yield (index, RouteResult) as they complete.
+
+        `pairs` : iterable of (start_node, end_node), as ('key', 'value') or a `node_id_attribute` value.
+        `algorithm` : the routing function or its name, see `algorithms.ALGORITHMS`.
+        `input_data` : a compiled graph directory, a dataset path or a loaded graph.
+        `workers` : number of worker processes, all the CPUs by default. 1 routes in this process.
+        `ordered` : yield the results in the order of `pairs`, else as soon as they complete.
+        `leg_cache_entries` : size of the leg cache of each worker (see `leg_cache`), no cache by default.
+
+        The result of a pair without route (or with an unknown node) is None.
+        Raise ValueError for an unknown algorithm, a missing dataset or a
+        compiled graph with an algorithm that needs the networkx graph.
+    """
+    # Checked here, an error in the initializer of a pool worker would restart it forever
+    algorithm_name = getattr(get_algorithm(algorithm), 'name', None)
+    if isinstance(input_data, str) and not os.path.isdir(input_data):
+        raise ValueError('No dataset directory %s' % input_data)
+    if is_compiled(input_data) and algorithm_name not in COMPILED_ALGORITHMS:
+        raise ValueError('Algorithm %s does not route over a compiled graph, use one of %s' % (
+            algorithm_name, ', '.join(COMPILED_ALGORITHMS)))
+    return _route_jobs(pairs, algorithm, input_data, workers, ordered, chunksize, node_id_attribute, leg_cache_entries)
+
+
+def _route_jobs(pairs, algorithm, input_data, workers, ordered, chunksize, node_id_attribute, leg_cache_entries):
+    """Yield the (index, RouteResult) of `pairs`, see `route_many`"""
+    jobs = ((index, pair, node_id_attribute) for index, pair in enumerate(pairs))
+    if workers == 1:
+        # In this process, the worker state and leg cache stay local to the batch
+        worker = _worker_state(input_data, algorithm)
+        leg_cache = LegCache(max_entries=leg_cache_entries) if leg_cache_entries else None
+        for job in jobs:
+            if leg_cache is None:
+                result = _route(job, worker)
+            else:
+                # Shared only while the job runs, not while the caller handles the result
+                with shared_leg_cache(leg_cache):
+                    result = _route(job, worker)
+            yield result
+        return
+
+    # Fork (where available) so the workers inherit an already loaded graph
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    if not isinstance(algorithm, str) and context.get_start_method() != 'fork':
+        algorithm = algorithm.name
+    with context.Pool(workers, initializer=_init_worker, initargs=(input_data, algorithm, leg_cache_entries)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for index, result in imap(_route, jobs, chunksize):
+            yield index, result
+
+
+if __name__ == "__main__":
+    print('Start')
+
+    input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/topic_data'
+    route_pairs = [
+        (4063, 33),
+        (6492, 3858),
+        (870, 3102),
+    ]
+    # Load the graph once, the forked workers share it
+    G = load_input_data(input_data_path)
+    for algorithm in ['a_star', 'a_star_landmark']:
+        for index, result in route_many(route_pairs, algorithm, G, workers=2):
+            print(index, result)
+
+    print('fin')
@@ -0,0 +1,211 @@
+"""
+Benchmark of the routing algorithms on the bundled test network or on a
+synthetic grid, reported as JSON to compare the results across commits.
+
+For each algorithm the same reproducible random origin-destination pairs are
+routed, and the report has the first query time (which includes building the
+derived data of the algorithm), the p50/p95/p99 query latency, the expanded
+nodes and the peak memory (tracemalloc) of the queries. Pairs without route
+(`no_route`) and failed queries (`errors`, e.g. an unknown node) are counted
+apart and left out of the latencies.
+
+    python benchmark.py --pairs 200 --output benchmark.json
+    python benchmark.py --grid 100 --algorithms a_star csr_a_star
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import networkx as nx
+
+from algorithms import ALGORITHMS, get_algorithm
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+TEST_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test', 'input')
+PERCENTILES = (50, 95, 99)
+
+
+def make_grid_graph(size, seed=0, landmark_ratio=0.05, edge_ratio=0.9, spacing=100.0):
+    """Return a synthetic road network: a `size` x `size` grid with jittered nodes,
+        a random `edge_ratio` of the grid edges and a random `landmark_ratio` of landmarks.
+    """
+    rnd = random.Random(seed)
+    G = nx.Graph()
+    keys = {}
+    street_id = 0
+    for i in range(size):
+        for j in range(size):
+            key = (i * spacing + rnd.random() * spacing / 10, j * spacing + rnd.random() * spacing / 10)
+            keys[i, j] = key
+            G.add_node(key, nodeID=len(keys) - 1, landmark=1 if rnd.random() < landmark_ratio else 0)
+    for i in range(size):
+        for j in range(size):
+            for di, dj in ((1, 0), (0, 1)):
+                if i + di < size and j + dj < size and rnd.random() < edge_ratio:
+                    u, v = keys[i, j], keys[i + di, j + dj]
+                    length = ((u[0] - v[0]) ** 2 + (u[1] - v[1]) ** 2) ** 0.5
+                    G.add_edge(u, v, streetID=street_id, length=length,
+                               Json=json.dumps({'type': 'LineString', 'coordinates': [u, v]}))
+                    street_id += 1
+    G.graph['source'] = None
+    G.graph['version'] = 0
+    return G
+
+
+def load_test_graph(copy_directory, input_data_path=TEST_INPUT):
+    """Return the graph of a copy of `input_data_path` in `copy_directory` and its load time.
+
+        The dataset is copied so the data derived by the algorithms (ALT tables,
+        contraction hierarchy...) is built during the benchmark and not written
+        next to the test data.
+    """
+    from graph_store import load_graph
+    copy_path = os.path.join(copy_directory, 'input')
+    shutil.copytree(input_data_path, copy_path)
+    start_time = time.perf_counter()
+    G = load_graph(copy_path)
+    return G, time.perf_counter() - start_time
+
+
+def sample_pairs(G, number_of_pairs, seed=0, node_id_attribute='nodeID'):
+    """Return `number_of_pairs` reproducible random (start, end) node id pairs of `G`"""
+    node_ids = sorted(value for _, value in G.nodes(data=node_id_attribute) if value is not None)
+    rnd = random.Random(seed)
+    return [tuple(rnd.sample(node_ids, 2)) for _ in range(number_of_pairs)]
+
+
+def _route(algorithm, G, pair, node_id_attribute):
+    """Return the result of routing `pair` with `algorithm` and the error of a failed query, else None.
+
+        Only a missing path and an unknown node fail a query, the other errors stop the benchmark.
+    """
+    try:
+        return algorithm((node_id_attribute, pair[0]), (node_id_attribute, pair[1]), G, None), None
+    except (nx.NetworkXNoPath, KeyError) as e:
+        return None, e
+
+
+def benchmark_algorithm(algorithm, G, pairs, node_id_attribute='nodeID', memory=True):
+    """Route every pair of `pairs` with `algorithm` and return the measures as a dictionary"""
+    algorithm = get_algorithm(algorithm)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # The first query builds the derived data of the algorithm
+        start_time = time.perf_counter()
+        _route(algorithm, G, pairs[0], node_id_attribute)
+        first_query = time.perf_counter() - start_time
+
+        # Latencies of the routed pairs only, a failed query is counted but not timed
+        latencies = []
+        expanded = []
+        lengths = []
+        no_route = errors = 0
+        for pair in pairs:
+            start_time = time.perf_counter()
+            result, error = _route(algorithm, G, pair, node_id_attribute)
+            elapsed = time.perf_counter() - start_time
+            if isinstance(error, nx.NetworkXNoPath):
+                no_route += 1
+                continue
+            if error is not None:
+                logger.warning('Pair %s failed with %s: %s', pair, algorithm.name, error)
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            expanded.append(result.expanded)
+            lengths.append(result.length)
+
+        # Separate run, tracemalloc slows the queries down
+        peak_memory = None
+        if memory:
+            tracemalloc.start()
+            for pair in pairs:
+                _route(algorithm, G, pair, node_id_attribute)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    report = {
+        'first_query': first_query,
+        'queries': len(pairs),
+        'routed': len(latencies),
+        'no_route': no_route,
+        'errors': errors,
+        'total_time': float(latencies.sum()),
+        'mean_latency': float(latencies.mean()) if len(latencies) else None,
+        'expanded_mean': float(np.mean(expanded)) if expanded else None,
+        'expanded_max': int(np.max(expanded)) if expanded else None,
+        'length_total': float(np.sum(lengths)),
+        'peak_memory': peak_memory,
+    }
+    for percentile in PERCENTILES:
+        report['p%d_latency' % percentile] = float(np.percentile(latencies, percentile)) if len(latencies) else None
+    return report
+
+
+def git_commit():
+    """Return the current git commit of the repository, or None"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(algorithms=None, grid_size=None, number_of_pairs=100, seed=0, memory=True):
+    """Run the benchmark of `algorithms` (every registered one by default) and return the report.
+
+        `grid_size` : benchmark a synthetic grid of this size instead of the test network.
+    """
+    with tempfile.TemporaryDirectory(prefix='routing_benchmark_') as copy_directory:
+        if grid_size:
+            start_time = time.perf_counter()
+            G = make_grid_graph(grid_size, seed)
+            load_time = time.perf_counter() - start_time
+            dataset = 'grid_%d' % grid_size
+        else:
+            G, load_time = load_test_graph(copy_directory)
+            dataset = 'test/input'
+        pairs = sample_pairs(G, number_of_pairs, seed)
+        report = {
+            'commit': git_commit(),
+            'dataset': dataset,
+            'number_of_nodes': G.number_of_nodes(),
+            'number_of_edges': G.number_of_edges(),
+            'load_time': load_time,
+            'pairs': number_of_pairs,
+            'seed': seed,
+            'algorithms': {},
+        }
+        # The derived data of the copied dataset is written until the end of the run
+        for algorithm in algorithms or sorted(ALGORITHMS):
+            report['algorithms'][algorithm] = benchmark_algorithm(algorithm, G, pairs, memory=memory)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the routing algorithms.')
+    parser.add_argument('--algorithms', nargs='+', choices=sorted(ALGORITHMS), help='algorithms to run, all by default')
+    parser.add_argument('--grid', type=int, help='size of a synthetic grid network instead of the test network')
+    parser.add_argument('--pairs', type=int, default=100, help='number of origin-destination pairs')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the pairs (and of the grid)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory run')
+    parser.add_argument('--output', help='JSON report file, printed if not set')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.algorithms, args.grid, args.pairs, args.seed, not args.no_memory)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -90,6 +90,19 @@ def generate_data_from_cvs(csv_file_paths):
         ])
     return data
 
+def generate_data_from_results(results, attribute):
+    """Generate data from routing results, without running the algorithms again.
+    `results`: A list of label and list of RouteResult
+    `attribute`: The RouteResult attribute to compare, e.g. length, expanded, or elapsed
+    """
+    data = []
+    for label, route_results in results:
+        data.append([
+            label,
+            np.array([getattr(result, attribute) for result in route_results])
+        ])
+    return data
+
 def generate_means_stds_labels(data):
     """
     Generate dictionary of means, stds, and labels from data.
@@ -0,0 +1,222 @@
+"""
+Compiled binary format of a road network graph.
+
+The graph is compiled once from the nodes and edges layer into flat NumPy
+arrays (node coordinates and attributes, CSR adjacency, edge lengths and edge
+coordinates), written as `.npy` files in a directory. Loading memory-maps the
+arrays, so worker processes start in milliseconds and share the same pages.
+
+    Layout of the arrays, for N nodes, E (undirected) edges and C edge vertices:
+        `node_x`, `node_y` : float64 [N], the node coordinates (the graph keys).
+        `node_id` : int64 [N], the `nodeID` attribute (-1 if missing).
+        `landmark` : int8 [N], the `landmark` attribute (0 if missing).
+        `offsets` : int64 [N + 1], the CSR row offsets.
+        `targets` : int64 [2E], the CSR neighbour of each half edge.
+        `weights` : float64 [2E], the `length` of each half edge.
+        `half_edges` : int64 [2E], the edge of each half edge.
+        `street_id` : int64 [E], the `streetID` attribute (-1 if missing).
+        `lengths` : float64 [E], the `length` attribute.
+        `coord_offsets` : int64 [E + 1], the offsets of each edge in `coords`.
+        `coords` : float64 [C, 2], the edge vertices, in digitised order.
+"""
+import json
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+ARRAY_NAMES = (
+    'node_x',
+    'node_y',
+    'node_id',
+    'landmark',
+    'offsets',
+    'targets',
+    'weights',
+    'half_edges',
+    'street_id',
+    'lengths',
+    'coord_offsets',
+    'coords',
+)
+
+
+class CompiledGraph(object):
+    """Road network graph stored as flat arrays, see the module docstring."""
+
+    def __init__(self, arrays, source=None):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.source = source
+        self._node_index = None
+        # Map of attribute name to {value: index of the first node with this value}
+        self._attribute_indexes = {}
+
+    @property
+    def number_of_nodes(self):
+        return len(self.node_x)
+
+    @property
+    def number_of_edges(self):
+        return len(self.lengths)
+
+    def node_key(self, index):
+        """Return the graph key (x, y) of the node `index`"""
+        return (float(self.node_x[index]), float(self.node_y[index]))
+
+    def node_index(self, key):
+        """Return the index of the node with graph key `key`"""
+        if self._node_index is None:
+            self._node_index = {
+                (x, y): i for i, (x, y) in enumerate(zip(self.node_x.tolist(), self.node_y.tolist()))
+            }
+        return self._node_index[key]
+
+    def attribute_index(self, key):
+        """Return the {value: index} map of the compiled node attribute `key` (first node of each value)"""
+        index = self._attribute_indexes.get(key)
+        if index is None:
+            if key == 'nodeID':
+                values = self.node_id.tolist()
+            elif key == 'landmark':
+                values = self.landmark.tolist()
+            else:
+                raise ValueError('Attribute %s is not compiled, use nodeID or landmark' % key)
+            # Reversed, so the first node of each value is kept
+            index = dict(zip(reversed(values), range(len(values) - 1, -1, -1)))
+            if key == 'nodeID':
+                # Nodes without `nodeID` (edge ends missing from the nodes layer) are compiled as -1
+                index.pop(-1, None)
+            self._attribute_indexes[key] = index
+        return index
+
+    def set_landmark(self, index, flag):
+        """Set the landmark flag of the node `index`"""
+        self.landmark[index] = flag or 0
+        self._attribute_indexes.pop('landmark', None)
+
+    def neighbours(self, index):
+        """Return the neighbour indexes and weights of the node `index`"""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.targets[start:end], self.weights[start:end]
+
+    def edge_coordinates(self, edge):
+        """Return the vertices of the edge `edge` as a [n, 2] array"""
+        return self.coords[self.coord_offsets[edge]:self.coord_offsets[edge + 1]]
+
+    @classmethod
+    def from_graph(cls, G):
+        """Compile the networkx graph `G` into arrays"""
+        nodes = sorted(G.nodes)
+        node_index = {node: i for i, node in enumerate(nodes)}
+        number_of_nodes = len(nodes)
+
+        node_x = np.array([node[0] for node in nodes], dtype=np.float64)
+        node_y = np.array([node[1] for node in nodes], dtype=np.float64)
+        node_id = np.array([G.node[node].get('nodeID', -1) for node in nodes], dtype=np.int64)
+        landmark = np.array([G.node[node].get('landmark') or 0 for node in nodes], dtype=np.int8)
+
+        edges = list(G.edges(data=True))
+        number_of_edges = len(edges)
+        edge_u = np.empty(number_of_edges, dtype=np.int64)
+        edge_v = np.empty(number_of_edges, dtype=np.int64)
+        street_id = np.empty(number_of_edges, dtype=np.int64)
+        lengths = np.empty(number_of_edges, dtype=np.float64)
+        coord_offsets = np.zeros(number_of_edges + 1, dtype=np.int64)
+        edge_coords = []
+        for i, (u, v, data) in enumerate(edges):
+            edge_u[i] = node_index[u]
+            edge_v[i] = node_index[v]
+            street_id[i] = data.get('streetID', -1)
+            lengths[i] = data['length']
+            if 'coordinates' in data:
+                points = data['coordinates']
+            elif 'Json' in data:
+                points = np.array(json.loads(data['Json'])['coordinates'], dtype=np.float64)[:, :2]
+            else:
+                points = np.array([u, v], dtype=np.float64)
+            edge_coords.append(points)
+            coord_offsets[i + 1] = coord_offsets[i] + len(points)
+        if edge_coords:
+            coords = np.concatenate(edge_coords)
+        else:
+            coords = np.empty((0, 2), dtype=np.float64)
+
+        # CSR adjacency, each undirected edge is stored as two half edges
+        sources = np.concatenate([edge_u, edge_v])
+        order = np.argsort(sources, kind='stable')
+        half_edges = np.concatenate([np.arange(number_of_edges)] * 2)[order]
+        targets = np.concatenate([edge_v, edge_u])[order]
+        weights = lengths[half_edges]
+        offsets = np.zeros(number_of_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=number_of_nodes), out=offsets[1:])
+
+        arrays = {
+            'node_x': node_x,
+            'node_y': node_y,
+            'node_id': node_id,
+            'landmark': landmark,
+            'offsets': offsets,
+            'targets': targets,
+            'weights': weights,
+            'half_edges': half_edges,
+            'street_id': street_id,
+            'lengths': lengths,
+            'coord_offsets': coord_offsets,
+            'coords': coords,
+        }
+        return cls(arrays, source=G.graph.get('source'))
+
+    def save(self, output_path):
+        """Write the arrays as `.npy` files in the directory `output_path`"""
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(output_path, name + '.npy'), getattr(self, name))
+        meta = {
+            'format_version': FORMAT_VERSION,
+            'source': self.source,
+            'number_of_nodes': self.number_of_nodes,
+            'number_of_edges': self.number_of_edges,
+        }
+        with open(os.path.join(output_path, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        return output_path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load the compiled graph in the directory `path`, memory-mapped by default"""
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta['format_version'] != FORMAT_VERSION:
+            raise RuntimeError(
+                'Unsupported compiled graph format {} in {}'.format(meta['format_version'], path))
+        arrays = {
+            name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+            for name in ARRAY_NAMES
+        }
+        return cls(arrays, source=meta['source'])
+
+
+def compile_graph(input_data, output_path):
+    """Compile `input_data` (a dataset path or a loaded graph) into `output_path`"""
+    from graph_store import get_graph
+    compiled = CompiledGraph.from_graph(get_graph(input_data))
+    compiled.save(output_path)
+    return compiled
+
+
+def load_compiled_graph(path, mmap_mode='r'):
+    """Load the compiled graph in the directory `path`"""
+    return CompiledGraph.load(path, mmap_mode=mmap_mode)
+
+
+if __name__ == "__main__":
+    input_data_path = './test/input'
+    output_path = './test/output/compiled'
+    compile_graph(input_data_path, output_path)
+    compiled = load_compiled_graph(output_path)
+    print('Number of nodes: %s' % compiled.number_of_nodes)
+    print('Number of edges: %s' % compiled.number_of_edges)
+    print('fin')
@@ -0,0 +1,332 @@
+"""
+Contraction hierarchy of a road network for fast shortest distance queries on
+a static network.
+
+The nodes are contracted one by one (by edge difference), adding a shortcut
+between two neighbours of the contracted node when no witness path without it
+is as short. A query is a bidirectional Dijkstra search that only follows
+edges to higher ranked nodes, and the shortcuts of the found path are unpacked
+to the original nodes.
+
+The hierarchy is stored as `.npy` files in the `ch` directory of the dataset:
+    `nodes` : float64 [N, 2], the node keys, indexed by node.
+    `rank` : int64 [N], the contraction order of each node.
+    `up_offsets` : int64 [N + 1], the CSR offsets of the upward edges.
+    `up_targets` : int64 [M], the higher ranked node of each upward edge.
+    `up_weights` : float64 [M], the `length` of each upward edge.
+    `up_middles` : int64 [M], the contracted node of a shortcut, -1 for a road.
+"""
+import json
+import os
+import time
+from heapq import heappush, heappop, heapify
+
+import numpy as np
+import networkx as nx
+
+from route_result import RouteResult
+from instrumentation import get_metrics, phase
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+CH_DIRECTORY = 'ch'
+ARRAY_NAMES = ('nodes', 'rank', 'up_offsets', 'up_targets', 'up_weights', 'up_middles')
+# Maximum number of nodes settled by a witness search. Stopping early only adds
+# shortcuts that are not needed, the queries stay correct.
+WITNESS_SETTLE_LIMIT = 200
+
+
+def _witness_distances(adjacency, source, excluded, targets, max_distance):
+    """Return the distances from `source` found without `excluded`, up to `max_distance`"""
+    distances = {source: 0.0}
+    heap = [(0.0, source)]
+    remaining = set(targets)
+    settled = 0
+    while heap and remaining:
+        distance, node = heappop(heap)
+        if distance > distances[node]:
+            continue
+        if distance > max_distance or settled >= WITNESS_SETTLE_LIMIT:
+            break
+        remaining.discard(node)
+        settled += 1
+        for neighbour, (weight, _) in adjacency[node].items():
+            if neighbour == excluded:
+                continue
+            neighbour_distance = distance + weight
+            if neighbour_distance < distances.get(neighbour, float('inf')):
+                distances[neighbour] = neighbour_distance
+                heappush(heap, (neighbour_distance, neighbour))
+    return distances
+
+
+def _shortcuts(adjacency, node):
+    """Return the shortcuts (u, w, length) needed to contract `node`"""
+    neighbours = list(adjacency[node].items())
+    shortcuts = []
+    for i, (u, (u_weight, _)) in enumerate(neighbours):
+        via = {w: u_weight + w_weight for w, (w_weight, _) in neighbours[i + 1:]}
+        if not via:
+            continue
+        distances = _witness_distances(adjacency, u, node, via, max(via.values()))
+        for w, length in via.items():
+            if distances.get(w, float('inf')) > length:
+                shortcuts.append((u, w, length))
+    return shortcuts
+
+
+class ContractionHierarchy(object):
+    """Contraction hierarchy, see the module docstring."""
+
+    def __init__(self, arrays):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.node_index = {(x, y): i for i, (x, y) in enumerate(np.asarray(self.nodes).tolist())}
+        # Python lists are the fastest to read in the query loop
+        self._offsets = np.asarray(self.up_offsets).tolist()
+        self._targets = np.asarray(self.up_targets).tolist()
+        self._weights = np.asarray(self.up_weights).tolist()
+        rank = np.asarray(self.rank)
+        self._middles = {}
+        for node in range(len(rank)):
+            for i in range(self._offsets[node], self._offsets[node + 1]):
+                self._middles[(node, self._targets[i])] = int(self.up_middles[i])
+        self._rank = rank.tolist()
+
+    @classmethod
+    def build(cls, G, weight='length'):
+        """Contract every node of the undirected graph `G`"""
+        nodes = sorted(G.nodes)
+        node_index = {node: i for i, node in enumerate(nodes)}
+        number_of_nodes = len(nodes)
+        # adjacency[u][v] = (length, middle node or -1) of the remaining graph
+        adjacency = [{} for _ in range(number_of_nodes)]
+        for u, v, data in G.edges(data=True):
+            if u == v:
+                continue
+            i, j = node_index[u], node_index[v]
+            length = data[weight]
+            if j not in adjacency[i] or length < adjacency[i][j][0]:
+                adjacency[i][j] = (length, -1)
+                adjacency[j][i] = (length, -1)
+
+        contracted_neighbours = [0] * number_of_nodes
+
+        def priority(node):
+            return len(_shortcuts(adjacency, node)) - len(adjacency[node]) + contracted_neighbours[node]
+
+        heap = [(priority(node), node) for node in range(number_of_nodes)]
+        heapify(heap)
+        rank = np.empty(number_of_nodes, dtype=np.int64)
+        upward = [None] * number_of_nodes
+        order = 0
+        while heap:
+            _, node = heappop(heap)
+            # Lazy update, contract the node only if it is still the best one
+            node_priority = priority(node)
+            if heap and node_priority > heap[0][0]:
+                heappush(heap, (node_priority, node))
+                continue
+            for u, w, length in _shortcuts(adjacency, node):
+                current = adjacency[u].get(w)
+                if current is None or length < current[0]:
+                    adjacency[u][w] = (length, node)
+                    adjacency[w][u] = (length, node)
+            # The remaining neighbours are contracted later, so they are ranked higher
+            upward[node] = adjacency[node]
+            for neighbour in adjacency[node]:
+                del adjacency[neighbour][node]
+                contracted_neighbours[neighbour] += 1
+            adjacency[node] = {}
+            rank[node] = order
+            order += 1
+
+        up_offsets = np.zeros(number_of_nodes + 1, dtype=np.int64)
+        up_offsets[1:] = np.cumsum([len(edges) for edges in upward])
+        up_targets = np.empty(up_offsets[-1], dtype=np.int64)
+        up_weights = np.empty(up_offsets[-1], dtype=np.float64)
+        up_middles = np.empty(up_offsets[-1], dtype=np.int64)
+        for node, edges in enumerate(upward):
+            for i, (target, (length, middle)) in enumerate(sorted(edges.items()), up_offsets[node]):
+                up_targets[i] = target
+                up_weights[i] = length
+                up_middles[i] = middle
+
+        return cls({
+            'nodes': np.array(nodes, dtype=np.float64).reshape(-1, 2),
+            'rank': rank,
+            'up_offsets': up_offsets,
+            'up_targets': up_targets,
+            'up_weights': up_weights,
+            'up_middles': up_middles,
+        })
+
+    def save(self, output_path, dataset_signature=None):
+        """Write the hierarchy as `.npy` files in the directory `output_path`"""
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(output_path, name + '.npy'), getattr(self, name))
+        with open(os.path.join(output_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'number_of_nodes': len(self.nodes),
+                'number_of_edges': len(self.up_targets),
+                'dataset_signature': dataset_signature,
+            }, f)
+        return output_path
+
+    @classmethod
+    def load(cls, path):
+        """Load the hierarchy in the directory `path`"""
+        return cls({name: np.load(os.path.join(path, name + '.npy')) for name in ARRAY_NAMES})
+
+    def query(self, source, target):
+        """Return the path (list of node indexes), length and number of settled nodes
+            from `source` to `target`
+        """
+        if source == target:
+            return [source], 0.0, 0
+        offsets, targets, weights = self._offsets, self._targets, self._weights
+        inf = float('inf')
+        distances = ({source: 0.0}, {target: 0.0})
+        parents = ({source: -1}, {target: -1})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best = inf
+        meeting_node = -1
+        settled = 0
+        while heaps[0] or heaps[1]:
+            # Search from the side with the smallest distance
+            if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]):
+                side = 0
+            else:
+                side = 1
+            heap = heaps[side]
+            distance, node = heappop(heap)
+            side_distances = distances[side]
+            if distance > side_distances[node]:
+                continue
+            if distance >= best:
+                # No shorter path can be found from this side
+                del heap[:]
+                continue
+            settled += 1
+            other_distance = distances[1 - side].get(node)
+            if other_distance is not None and distance + other_distance < best:
+                best = distance + other_distance
+                meeting_node = node
+            side_parents = parents[side]
+            for i in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[i]
+                neighbour_distance = distance + weights[i]
+                if neighbour_distance < side_distances.get(neighbour, inf):
+                    side_distances[neighbour] = neighbour_distance
+                    side_parents[neighbour] = node
+                    heappush(heap, (neighbour_distance, neighbour))
+
+        if meeting_node == -1:
+            raise nx.NetworkXNoPath('Node %s not reachable from %s' % (target, source))
+
+        # Upward path from the source to the meeting node, then down to the target
+        up_path = [meeting_node]
+        while up_path[-1] != source:
+            up_path.append(parents[0][up_path[-1]])
+        up_path.reverse()
+        down_path = [meeting_node]
+        while down_path[-1] != target:
+            down_path.append(parents[1][down_path[-1]])
+
+        path = [source]
+        for edges in (up_path, down_path):
+            for i in range(len(edges) - 1):
+                self._unpack(edges[i], edges[i + 1], path)
+        return path, best, settled
+
+    def _unpack(self, a, b, path):
+        """Append the original nodes of the edge from `a` to `b` (without `a`) to `path`"""
+        stack = [(a, b)]
+        while stack:
+            a, b = stack.pop()
+            if self._rank[a] < self._rank[b]:
+                middle = self._middles[(a, b)]
+            else:
+                middle = self._middles[(b, a)]
+            if middle < 0:
+                path.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+
+    def node_key(self, index):
+        """Return the graph key (x, y) of the node `index`"""
+        return (float(self.nodes[index][0]), float(self.nodes[index][1]))
+
+
+def get_contraction_hierarchy(G):
+    """Return the contraction hierarchy of `G`, loaded from its dataset or built (and saved) once"""
+    from graph_index import graph_signature
+    from graph_store import derived_directory, write_derived_directory
+    signature = graph_signature(G)
+    cached = G.graph.get('contraction_hierarchy')
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    hierarchy = None
+    # A hierarchy on disk is only valid for the unchanged dataset
+    path, source_signature = derived_directory(G, CH_DIRECTORY)
+    if path and os.path.exists(os.path.join(path, 'meta.json')):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('dataset_signature') == source_signature:
+            hierarchy = ContractionHierarchy.load(path)
+    if hierarchy is None:
+        hierarchy = ContractionHierarchy.build(G)
+        if path:
+            write_derived_directory(path, lambda directory: hierarchy.save(directory, source_signature))
+    G.graph['contraction_hierarchy'] = (signature, hierarchy)
+    return hierarchy
+
+
+def shortest_path_a_star(start_node, end_node, input_data_path, output_file):
+    """Shortest distance path with the contraction hierarchy of the graph
+
+        Same arguments and result as `a_star.shortest_path_a_star`.
+    """
+    from graph_store import get_graph
+    from graph_index import get_graph_index
+    metrics = get_metrics()
+    with phase(metrics, 'graph_load'):
+        G = get_graph(input_data_path)
+        hierarchy = get_contraction_hierarchy(G)
+    start_time = time.perf_counter()
+
+    # Get start and end node
+    with phase(metrics, 'endpoint_lookup'):
+        index = get_graph_index(G)
+        start = hierarchy.node_index[index.get_node(start_node[0], start_node[1])]
+        end = hierarchy.node_index[index.get_node(end_node[0], end_node[1])]
+
+    with phase(metrics, 'leg'):
+        path, length, settled = hierarchy.query(start, end)
+    if metrics is not None:
+        metrics.count('nodes_settled', settled)
+    logger.debug('Shortest path length: %f', length)
+
+    return RouteResult(
+        [hierarchy.node_key(node) for node in path],
+        length,
+        expanded=settled,
+        elapsed=time.perf_counter() - start_time,
+        algorithm=shortest_path_a_star.name
+    )
+
+shortest_path_a_star.name = 'contraction_hierarchy'
+
+if __name__ == "__main__":
+    from graph_store import load_graph
+
+    input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/topic_data'
+    G = load_graph(input_data_path)
+    start_time = time.perf_counter()
+    hierarchy = get_contraction_hierarchy(G)
+    print('Contraction hierarchy: %d upward edges in %f s' % (len(hierarchy.up_targets), time.perf_counter() - start_time))
+    print('fin')
@@ -0,0 +1,200 @@
+"""
+A* shortest path over the array-backed (CSR) graph of `compiled_graph`.
+
+Nodes are integer indexes, the adjacency, weights and coordinates are read
+from contiguous arrays, and the g-score and parent arrays are allocated once
+per graph and reset through the list of visited nodes after every search.
+"""
+import logging
+import os
+import time
+from array import array
+from heapq import heappush, heappop
+
+import numpy as np
+import networkx as nx
+
+from compiled_graph import CompiledGraph
+from route_result import RouteResult
+from instrumentation import get_metrics, phase
+from utils import get_logger, enable_verbose_output
+
+logger = get_logger(__name__)
+
+
+class CSRAStar(object):
+    """A* search engine over a `CompiledGraph`."""
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        number_of_nodes = compiled.number_of_nodes
+        # memoryview indexing returns Python scalars without copying the arrays
+        self.offsets = memoryview(np.ascontiguousarray(compiled.offsets))
+        self.targets = memoryview(np.ascontiguousarray(compiled.targets))
+        self.weights = memoryview(np.ascontiguousarray(compiled.weights))
+        self.x = memoryview(np.ascontiguousarray(compiled.node_x))
+        self.y = memoryview(np.ascontiguousarray(compiled.node_y))
+        # Search state, reset after each search through `visited`
+        self.g_score = array('d', [float('inf')]) * number_of_nodes
+        self.parent = array('q', [-1]) * number_of_nodes
+        self.closed = bytearray(number_of_nodes)
+        self.visited = []
+
+    def reset(self):
+        """Reset the search state of the visited nodes"""
+        g_score, parent, closed = self.g_score, self.parent, self.closed
+        inf = float('inf')
+        for node in self.visited:
+            g_score[node] = inf
+            parent[node] = -1
+            closed[node] = 0
+        self.visited = []
+
+    def search(self, source, target):
+        """Return the path (list of node indexes), length and number of expanded nodes
+            from `source` to `target`
+        """
+        self.reset()
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        x, y = self.x, self.y
+        g_score, parent, closed, visited = self.g_score, self.parent, self.closed, self.visited
+        target_x, target_y = x[target], y[target]
+        expanded = 0
+
+        g_score[source] = 0.0
+        visited.append(source)
+        heap = [(((x[source] - target_x) ** 2 + (y[source] - target_y) ** 2) ** 0.5, source)]
+        while heap:
+            _, node = heappop(heap)
+            if closed[node]:
+                continue
+            if node == target:
+                break
+            closed[node] = 1
+            expanded += 1
+            node_g = g_score[node]
+            for i in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[i]
+                if closed[neighbour]:
+                    continue
+                g = node_g + weights[i]
+                if g < g_score[neighbour]:
+                    if parent[neighbour] == -1 and neighbour != source:
+                        visited.append(neighbour)
+                    g_score[neighbour] = g
+                    parent[neighbour] = node
+                    h = ((x[neighbour] - target_x) ** 2 + (y[neighbour] - target_y) ** 2) ** 0.5
+                    heappush(heap, (g + h, neighbour))
+        else:
+            raise nx.NetworkXNoPath('Node %s not reachable from %s' % (target, source))
+
+        path = [target]
+        while path[-1] != source:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return path, g_score[target], expanded
+
+
+def get_engine(input_data):
+    """Return the A* engine of `input_data`, a compiled graph, a loaded graph or a dataset path.
+
+        The engine of a networkx graph is compiled once and kept in the graph,
+        until the graph is changed (see `graph_index.graph_changed`).
+    """
+    if isinstance(input_data, CSRAStar):
+        return input_data
+    if isinstance(input_data, CompiledGraph):
+        return CSRAStar(input_data)
+    from graph_store import get_graph
+    from graph_index import graph_signature
+    G = get_graph(input_data)
+    signature = graph_signature(G)
+    cached = G.graph.get('csr_a_star')
+    if cached is None or cached[0] != signature:
+        cached = (signature, CSRAStar(CompiledGraph.from_graph(G)))
+        G.graph['csr_a_star'] = cached
+    return cached[1]
+
+
+def get_node_index(compiled, key, value):
+    """Return the index of the node that has attribute key = value"""
+    index = compiled.attribute_index(key)
+    try:
+        return index[value]
+    except KeyError:
+        raise KeyError('No node with %s = %s' % (key, value))
+
+
+def shortest_path_a_star(start_node, end_node, input_data_path, output_file):
+    """Main function for A* shortest path over the CSR graph
+
+        `start_node` and `end_node` are ('key', 'value') format.
+        `input_data_path` is a path to directory with nodes and edges layer,
+            a graph loaded with `graph_store.load_graph`, a `CompiledGraph` or a `CSRAStar`.
+        `output_file` is a path to the output shape file (unused, see the wrapper).
+
+        Return a `RouteResult`.
+    """
+    metrics = get_metrics()
+    with phase(metrics, 'graph_load'):
+        engine = get_engine(input_data_path)
+    compiled = engine.compiled
+    start_time = time.perf_counter()
+
+    # Get start and end node
+    with phase(metrics, 'endpoint_lookup'):
+        start = get_node_index(compiled, start_node[0], start_node[1])
+        end = get_node_index(compiled, end_node[0], end_node[1])
+
+    # Find shortest path
+    with phase(metrics, 'leg'):
+        path, length, expanded = engine.search(start, end)
+    if metrics is not None:
+        metrics.count('nodes_settled', expanded)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Shortest path: %s', ' - '.join(['%d' % compiled.node_id[node] for node in path]))
+    logger.debug('Shortest path length: %f', length)
+
+    return RouteResult(
+        [compiled.node_key(node) for node in path],
+        length,
+        expanded=expanded,
+        elapsed=time.perf_counter() - start_time,
+        algorithm=shortest_path_a_star.name
+    )
+
+shortest_path_a_star.name = 'csr_a_star'
+
+if __name__ == "__main__":
+    print('Start')
+    # Research run, print the details of every query
+    enable_verbose_output()
+
+    id_field = 'nodeID'
+    input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/topic_data'
+    base_output_file =  '/home/ismailsunni/dev/python/routing/test/output/'
+    route_pairs = [
+        {
+            'name': 'A',
+            'start': 4063,
+            'end': 33
+        },
+        {
+            'name': 'B',
+            'start': 6492,
+            'end': 3858
+        },
+        {
+            'name': 'C',
+            'start': 870,
+            'end': 3102
+        },
+    ]
+    engine = get_engine(input_data_path)
+    for pair in route_pairs:
+        start_node = (id_field, pair['start'])
+        end_node = (id_field, pair['end'])
+        output_file = os.path.join(base_output_file, 'csr_%s.shp' % pair['name'])
+        shortest_path_a_star(start_node, end_node, engine, output_file)
+
+    print('fin')
@@ -0,0 +1,101 @@
+"""
+Attribute index of a graph, to find nodes by attribute value without scanning
+every node.
+
+The index is built once per graph and kept in `G.graph`. It is rebuilt when
+the graph signature (the `version` in `G.graph`) changes, so call
+`graph_changed` after editing the graph, or use `graph_updates` to update the
+index in place.
+"""
+import numpy as np
+
+INDEXED_ATTRIBUTES = ('nodeID', 'landmark')
+
+
+def graph_signature(G):
+    """Return the signature of `G`, changed by `graph_changed`.
+
+        Only the version counter, so checking the derived data on every query is
+        O(1) (`G.number_of_edges()` walks every node in networkx).
+    """
+    return G.graph.get('version', 0)
+
+
+def graph_changed(G):
+    """Mark `G` as changed, its index and derived data are rebuilt on the next use"""
+    G.graph['version'] = G.graph.get('version', 0) + 1
+
+
+class GraphIndex(object):
+    """Map of attribute value to nodes for the `attributes` of the nodes of `G`"""
+
+    def __init__(self, G, attributes=INDEXED_ATTRIBUTES):
+        self.graph = G
+        self.signature = graph_signature(G)
+        self.attributes = {attribute: {} for attribute in attributes}
+        for node, data in G.nodes(data=True):
+            for attribute, nodes_by_value in self.attributes.items():
+                value = data.get(attribute)
+                if value is not None:
+                    nodes_by_value.setdefault(value, []).append(node)
+        self._index_landmarks()
+
+    def _index_landmarks(self):
+        """Set the landmark nodes and their coordinates from the `landmark` index"""
+        self.landmark_nodes = tuple(self.get_nodes('landmark', 1))
+        self.landmark_coordinates = np.array(self.landmark_nodes, dtype=np.float64).reshape(-1, 2)
+        self._landmark_snapper = None
+
+    @property
+    def landmark_snapper(self):
+        """Spatial index (`snapping.KDTreeSnapper`) of the landmark nodes, built on first use"""
+        if self._landmark_snapper is None:
+            from snapping import KDTreeSnapper
+            self._landmark_snapper = KDTreeSnapper(self.landmark_nodes)
+        return self._landmark_snapper
+
+    def add_attribute(self, key):
+        """Index the attribute `key` of every node"""
+        nodes_by_value = {}
+        for node, value in self.graph.nodes(data=key):
+            if value is not None:
+                nodes_by_value.setdefault(value, []).append(node)
+        self.attributes[key] = nodes_by_value
+
+    def update_attribute(self, node, key, old_value, value):
+        """Move `node` from `old_value` to `value` in the index of the attribute `key`"""
+        nodes_by_value = self.attributes.get(key)
+        if nodes_by_value is None:
+            return
+        if old_value is not None:
+            nodes = nodes_by_value.get(old_value, [])
+            if node in nodes:
+                nodes.remove(node)
+            if not nodes:
+                nodes_by_value.pop(old_value, None)
+        if value is not None:
+            nodes_by_value.setdefault(value, []).append(node)
+        if key == 'landmark':
+            self._index_landmarks()
+
+    def get_nodes(self, key, value):
+        """Return list of nodes that has attribute key = value"""
+        if key not in self.attributes:
+            self.add_attribute(key)
+        return self.attributes[key].get(value, [])
+
+    def get_node(self, key, value):
+        """Return the first node that has attribute key = value"""
+        nodes = self.get_nodes(key, value)
+        if not nodes:
+            raise KeyError('No node with %s = %s' % (key, value))
+        return nodes[0]
+
+
+def get_graph_index(G):
+    """Return the attribute index of `G`, building it if `G` has changed"""
+    index = G.graph.get('index')
+    if index is None or index.signature != graph_signature(G):
+        index = GraphIndex(G)
+        G.graph['index'] = index
+    return index
@@ -0,0 +1,137 @@
+"""
+Long-lived store of road network graphs, so a dataset is read once and shared
+by every routing call.
+
+A graph is keyed by the absolute dataset path and the modification time and
+size of its files, so editing the shapefiles (e.g. with `prepare_data.py`)
+makes the next `load_graph` call read the dataset again.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import networkx as nx
+
+from graph_index import get_graph_index
+from route_geometry import parse_edge_coordinates
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+# Map of dataset path to (signature, graph)
+_graphs = {}
+
+
+def dataset_signature(input_data_path):
+    """Return the signature (file name, mtime, size) of files in `input_data_path`"""
+    if os.path.isdir(input_data_path):
+        entries = sorted(os.scandir(input_data_path), key=lambda entry: entry.name)
+        stats = [(entry.name, entry.stat()) for entry in entries if entry.is_file()]
+    else:
+        stats = [(os.path.basename(input_data_path), os.stat(input_data_path))]
+    return tuple((name, stat.st_mtime_ns, stat.st_size) for name, stat in stats)
+
+
+def read_graph(input_data_path):
+    """Read the nodes and edges layer in `input_data_path` as an undirected graph"""
+    G = nx.Graph(nx.read_shp(input_data_path, strict=False, geom_attrs=True)) # Read and convert to Graph
+    G.graph['source'] = input_data_path
+    G.graph['version'] = 0
+    parse_edge_coordinates(G)
+    get_graph_index(G)
+    return G
+
+
+def load_graph(input_data_path):
+    """Return the graph of `input_data_path`, reading it only if it has changed.
+
+        `input_data_path` is a path to directory with nodes and edges layer.
+    """
+    key = os.path.abspath(input_data_path)
+    signature = dataset_signature(key)
+    cached = _graphs.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    G = read_graph(key)
+    _graphs[key] = (signature, G)
+    return G
+
+
+def get_graph(input_data):
+    """Return the graph of `input_data`, either a loaded graph or a dataset path"""
+    if isinstance(input_data, nx.Graph):
+        return input_data
+    return load_graph(input_data)
+
+
+def get_source_path(input_data):
+    """Return the dataset path of `input_data`, either a loaded graph or a dataset path"""
+    if isinstance(input_data, nx.Graph):
+        return input_data.graph['source']
+    return input_data
+
+
+def derived_directory(G, name):
+    """Return the directory `name` for data derived from `G`, next to its dataset,
+        and the dataset signature to store with the data.
+
+        Return (None, None) if `G` is not read from a dataset directory or has been
+        changed since, as data derived from it would not match the dataset.
+    """
+    source = G.graph.get('source')
+    if not source or not os.path.isdir(source) or G.graph.get('version'):
+        return None, None
+    # JSON round trip, to compare with the signature stored in a JSON file
+    signature = json.loads(json.dumps(dataset_signature(source)))
+    return os.path.join(source, name), signature
+
+
+def _stored_signature(path):
+    """Return the dataset signature in the `meta.json` file of the derived data in `path`, or None"""
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            return json.load(f).get('dataset_signature')
+    except (OSError, ValueError):
+        return None
+
+
+def write_derived_directory(path, write):
+    """Write derived data into the directory `path` with `write(directory)`, atomically.
+
+        The data is written into a temporary directory next to `path` and renamed
+        to `path`, so a process loading `path` never sees a partially written
+        directory, even when several processes build the same data at once. Data
+        of the same dataset already in `path` is kept.
+        Return False if `path` could not be replaced, the data is then not saved.
+    """
+    parent, name = os.path.split(path)
+    temp_path = old_path = None
+    try:
+        temp_path = tempfile.mkdtemp(prefix='.%s-' % name, dir=parent)
+        write(temp_path)
+        signature = _stored_signature(temp_path)
+        if signature is not None and _stored_signature(path) == signature:
+            # Already written by another process, another process may be loading it
+            return True
+        if os.path.exists(path):
+            # A directory is only renamed over an empty one, move the stale data out of the way
+            old_path = tempfile.mkdtemp(prefix='.%s-old-' % name, dir=parent)
+            os.replace(path, old_path)
+        os.replace(temp_path, path)
+        return True
+    except OSError as e:
+        # Written by another process in the meantime, or a read-only dataset
+        if not os.path.exists(path):
+            logger.warning('Derived data not saved in %s: %s', path, e)
+        return False
+    finally:
+        if temp_path is not None:
+            shutil.rmtree(temp_path, ignore_errors=True)
+        if old_path is not None:
+            shutil.rmtree(old_path, ignore_errors=True)
+
+
+def clear_graphs():
+    """Forget every loaded graph"""
+    _graphs.clear()
@@ -0,0 +1,237 @@
+"""
+Incremental updates of a loaded graph: landmark flag changes, edge closures
+and edge length changes, without reading the dataset again.
+
+The graph is marked as changed (see `graph_index.graph_changed`), but the data
+derived from it that is still valid is updated in place and kept:
+    `index` : the landmark index is updated, nodes are never removed.
+    `node_snapper` : kept, the nodes do not change.
+    `csr_a_star` : the half edge weights and landmark flags are updated, a closed
+        edge is kept with an infinite weight.
+    `alt` : kept unless an edge gets shorter (or reopens), the distances only
+        grow otherwise, so the bounds stay admissible.
+    `contraction_hierarchy` : dropped on any edge change.
+    `landmark_matrix` : dropped on a landmark change, an edge that gets shorter,
+        or a change of an edge of a landmark to landmark path.
+    leg cache : only the legs that may no longer be shortest paths are removed,
+        the others are moved to the new graph version.
+
+Nodes are graph keys (x, y), see `graph_index.GraphIndex.get_node` to find
+them by `nodeID`.
+"""
+import numpy as np
+
+from graph_index import get_graph_index, graph_changed, graph_signature
+from leg_cache import get_leg_cache, graph_key
+from utils import calculate_distance
+
+# Derived data kept in `G.graph` as (signature, ...) tuples
+DERIVED_DATA = ('csr_a_star', 'node_snapper', 'alt', 'contraction_hierarchy', 'landmark_matrix')
+
+
+def _half_edges(compiled, u, v):
+    """Return the half edge indexes between the nodes `u` and `v` of `compiled`"""
+    i, j = compiled.node_index(u), compiled.node_index(v)
+    half_edges = []
+    for a, b in ((i, j), (j, i)):
+        start, end = compiled.offsets[a], compiled.offsets[a + 1]
+        half_edges.extend(start + np.flatnonzero(compiled.targets[start:end] == b))
+    return half_edges
+
+
+def _in_landmark_paths(matrix, edges):
+    """Return True if one of `edges` is in a landmark to landmark path of `matrix`"""
+    if not matrix.with_paths:
+        return True
+    return any(matrix.uses_edge(u, v) for u, v in edges)
+
+
+def _leg_invalid(changed_edges, shorter_edges):
+    """Return the leg cache predicate of the legs that may no longer be shortest paths.
+
+        A leg is invalid if it uses a changed edge, or if a path through an edge
+        that got shorter may now be shorter than the leg (Euclidean lower bound).
+    """
+    def predicate(key, path, length):
+        weight = key[-1]
+        for a, b in zip(path, path[1:]):
+            if (a, b) in changed_edges:
+                return True
+        if weight != 'length':
+            return False
+        source, target = key[-3], key[-2]
+        for (u, v), edge_length in shorter_edges.items():
+            bound = min(
+                calculate_distance(source, u) + edge_length + calculate_distance(v, target),
+                calculate_distance(source, v) + edge_length + calculate_distance(u, target),
+            )
+            if bound < length:
+                return True
+        return False
+    return predicate
+
+
+def _check_updates(G, closed, landmarks, closed_edges, opened_edges, edge_lengths):
+    """Raise KeyError (unknown node, missing edge, edge not closed) or ValueError (negative
+        length) if the changes can not all be applied to `G`, before any of them is applied.
+    """
+    for node in landmarks:
+        if node not in G:
+            raise KeyError('No node %s in the graph' % (node,))
+    closing = set()
+    for u, v in closed_edges:
+        if not G.has_edge(u, v) or (u, v) in closing:
+            raise KeyError('No edge %s - %s to close' % (u, v))
+        closing.update([(u, v), (v, u)])
+    opening = set()
+    for u, v in opened_edges:
+        if (u, v) in opening or not ((u, v) in closing or (u, v) in closed or (v, u) in closed):
+            raise KeyError('Edge %s - %s is not closed' % (u, v))
+        opening.update([(u, v), (v, u)])
+    for (u, v), length in edge_lengths.items():
+        if (u, v) not in opening and (not G.has_edge(u, v) or (u, v) in closing):
+            raise KeyError('No edge %s - %s to change' % (u, v))
+        if not length >= 0:
+            raise ValueError('Invalid length %s of the edge %s - %s' % (length, u, v))
+
+
+def apply_updates(G, landmarks=None, closed_edges=None, opened_edges=None, edge_lengths=None, leg_cache=None):
+    """Apply the changes to the loaded graph `G` and its derived data, see the module docstring.
+
+        `landmarks` : {node: landmark flag (1 or 0)}.
+        `closed_edges` : list of (u, v) edges removed from the graph. Their data is
+            kept in `G.graph['closed_edges']` to reopen them.
+        `opened_edges` : list of (u, v) closed edges added back to the graph.
+        `edge_lengths` : {(u, v): new `length`}.
+        `leg_cache` : the leg cache to update, the shared one by default.
+
+        Return the list of the derived data names that were dropped. Raise KeyError or
+        ValueError, without changing `G`, if one of the changes can not be applied.
+    """
+    landmarks = landmarks or {}
+    closed_edges = closed_edges or []
+    opened_edges = opened_edges or []
+    edge_lengths = edge_lengths or {}
+    _check_updates(G, G.graph.get('closed_edges', {}), landmarks, closed_edges, opened_edges, edge_lengths)
+    old_signature = graph_signature(G)
+    old_graph_key = graph_key(G)
+    index = get_graph_index(G)
+    engine = G.graph.get('csr_a_star')
+    if engine is not None and engine[0] != old_signature:
+        engine = None
+    compiled = engine[1].compiled if engine is not None else None
+
+    # Changed edges (both directions) and edges that got shorter, with their new length
+    changed_edges = set()
+    shorter_edges = {}
+    dropped = []
+
+    for node, flag in landmarks.items():
+        old_flag = G.node[node].get('landmark')
+        G.node[node]['landmark'] = flag
+        index.update_attribute(node, 'landmark', old_flag, flag)
+        if compiled is not None:
+            compiled.set_landmark(compiled.node_index(node), flag)
+
+    closed = G.graph.setdefault('closed_edges', {})
+    for u, v in closed_edges:
+        closed[(u, v)] = G[u][v]
+        G.remove_edge(u, v)
+        changed_edges.update([(u, v), (v, u)])
+        if compiled is not None:
+            for i in _half_edges(compiled, u, v):
+                compiled.weights[i] = float('inf')
+
+    for u, v in opened_edges:
+        data = closed.pop((u, v), None)
+        if data is None:
+            data = closed.pop((v, u))
+        G.add_edge(u, v, **data)
+        shorter_edges[(u, v)] = data['length']
+        if compiled is not None:
+            half_edges = _half_edges(compiled, u, v)
+            if not half_edges:
+                # Compiled while the edge was closed, compile it again
+                del G.graph['csr_a_star']
+                dropped.append('csr_a_star')
+                compiled = None
+            for i in half_edges:
+                compiled.weights[i] = compiled.lengths[compiled.half_edges[i]]
+
+    for (u, v), length in edge_lengths.items():
+        data = G[u][v]
+        if length < data['length']:
+            shorter_edges[(u, v)] = length
+        data['length'] = length
+        changed_edges.update([(u, v), (v, u)])
+        if compiled is not None:
+            for i in _half_edges(compiled, u, v):
+                compiled.weights[i] = length
+                compiled.lengths[compiled.half_edges[i]] = length
+
+    graph_changed(G)
+    signature = graph_signature(G)
+    index.signature = signature
+
+    # Derived data still valid is stamped with the new signature, the rest is dropped
+    edges_changed = bool(changed_edges or shorter_edges)
+    for name in DERIVED_DATA:
+        cached = G.graph.get(name)
+        if cached is None or cached[0] != old_signature:
+            continue
+        if name == 'alt':
+            valid = not shorter_edges
+        elif name == 'contraction_hierarchy':
+            valid = not edges_changed
+        elif name == 'landmark_matrix':
+            valid = not landmarks and not shorter_edges and not (
+                changed_edges and _in_landmark_paths(cached[1], changed_edges))
+        else:
+            valid = True
+        if valid:
+            G.graph[name] = (signature,) + cached[1:]
+        else:
+            del G.graph[name]
+            dropped.append(name)
+
+    leg_cache = get_leg_cache(leg_cache)
+    if leg_cache is not None:
+        if edges_changed:
+            size = len(old_graph_key)
+            invalid = _leg_invalid(changed_edges, shorter_edges)
+            leg_cache.invalidate(lambda key, path, length: key[:size] == old_graph_key and invalid(key, path, length))
+        leg_cache.rekey(old_graph_key, graph_key(G))
+    return dropped
+
+
+def set_landmarks(G, landmarks, leg_cache=None):
+    """Set the landmark flag of the nodes of `G`, `landmarks` is {node: flag}"""
+    return apply_updates(G, landmarks=landmarks, leg_cache=leg_cache)
+
+
+def close_edges(G, edges, leg_cache=None):
+    """Remove the (u, v) `edges` from `G`, until they are reopened with `open_edges`"""
+    return apply_updates(G, closed_edges=edges, leg_cache=leg_cache)
+
+
+def open_edges(G, edges, leg_cache=None):
+    """Add back the (u, v) `edges` closed with `close_edges` to `G`"""
+    return apply_updates(G, opened_edges=edges, leg_cache=leg_cache)
+
+
+def set_edge_lengths(G, edge_lengths, leg_cache=None):
+    """Set the `length` of the edges of `G`, `edge_lengths` is {(u, v): length}"""
+    return apply_updates(G, edge_lengths=edge_lengths, leg_cache=leg_cache)
+
+
+if __name__ == "__main__":
+    from graph_store import load_graph
+
+    input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/topic_data'
+    G = load_graph(input_data_path)
+    index = get_graph_index(G)
+    u = index.get_node('nodeID', 4063)
+    v = next(iter(G[u]))
+    print('Dropped: %s' % close_edges(G, [(u, v)]))
+    print('Dropped: %s' % open_edges(G, [(u, v)]))
+    print('fin')
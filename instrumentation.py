@@ -0,0 +1,115 @@
+"""
+Opt-in instrumentation of the routing functions: timings of their phases
+(graph load, endpoint lookup, landmark selection, each leg, loop removal,
+geometry stitching, output write) and counters (nodes settled, heap pushes,
+leg cache hits), exported to a metrics sink.
+
+It is disabled by default, the routing functions then only check that
+`get_metrics()` is None, nothing is recorded in the search loops.
+
+    with instrumented(sink=print) as metrics:
+        shortest_path_a_star(start_node, end_node, G, None)
+    metrics.to_dict()
+"""
+import time
+from contextlib import contextmanager, nullcontext
+
+# Metrics recorded by the routing functions, see `enable_instrumentation`
+_metrics = None
+# Phase context manager when the instrumentation is disabled
+NO_PHASE = nullcontext()
+
+
+class Metrics(object):
+    """Timings of phases and counters, see the module docstring.
+
+        `sink` is a function called with `to_dict()` by `export`.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        # Map of phase name to [number of calls, total time, maximum time]
+        self.timings = {}
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager recording the time spent in the phase `name`"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start_time)
+
+    def add_time(self, name, seconds):
+        """Record a call of the phase `name` that took `seconds`"""
+        timing = self.timings.get(name)
+        if timing is None:
+            self.timings[name] = [1, seconds, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+            if seconds > timing[2]:
+                timing[2] = seconds
+
+    def count(self, name, value=1):
+        """Add `value` to the counter `name`"""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        """Return the timings and counters as a dictionary"""
+        return {
+            'timings': {
+                name: {'calls': calls, 'total': total, 'max': maximum}
+                for name, (calls, total, maximum) in self.timings.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def export(self):
+        """Send the metrics to the sink"""
+        if self.sink is not None:
+            self.sink(self.to_dict())
+
+    def reset(self):
+        """Forget every timing and counter"""
+        self.timings.clear()
+        self.counters.clear()
+
+
+def phase(metrics, name):
+    """Return the context manager timing the phase `name` in `metrics`, a no-op if it is None"""
+    if metrics is None:
+        return NO_PHASE
+    return metrics.phase(name)
+
+
+def enable_instrumentation(sink=None):
+    """Record the metrics of the routing functions and return them"""
+    global _metrics
+    _metrics = Metrics(sink)
+    return _metrics
+
+
+def disable_instrumentation():
+    """Stop recording the metrics of the routing functions"""
+    global _metrics
+    _metrics = None
+
+
+def get_metrics():
+    """Return the metrics recorded by the routing functions, None if disabled"""
+    return _metrics
+
+
+@contextmanager
+def instrumented(sink=None):
+    """Record the metrics of the routing functions in the block, and export them at the end"""
+    global _metrics
+    previous = _metrics
+    metrics = enable_instrumentation(sink)
+    try:
+        yield metrics
+    finally:
+        _metrics = previous
+        metrics.export()
@@ -0,0 +1,238 @@
+"""
+Precomputed network distances and shortest paths between every pair of
+landmark nodes, for the landmark algorithm of `a_star_landmark`.
+
+The matrix is computed offline with one Dijkstra search per landmark and
+stored in the `landmarks` directory of the dataset:
+    `nodes` : float64 [N, 2], the node keys, indexed by node.
+    `landmarks` : float64 [L, 2], the landmark node keys, indexed by landmark.
+    `distances` : float32 [L, L], the network distance between two landmarks.
+    `path_offsets` : int64 [L (L - 1) / 2 + 1], the offsets in `path_nodes` of the
+        path of each landmark pair i < j (empty if j is not reachable from i).
+    `path_nodes` : int32 [P], the nodes of the landmark to landmark paths, packed.
+        The path from j to i is the reverse of the path from i to j. The paths
+        are optional, they are needed to stitch the legs between landmarks.
+
+A route picks its transit landmarks like the default landmark algorithm, only
+the first and last legs (from the start and to the end) are searched, the legs
+between two landmarks are read from the matrix.
+"""
+import json
+import os
+from heapq import heappush, heappop
+
+import numpy as np
+import networkx as nx
+
+LANDMARK_DIRECTORY = 'landmarks'
+# Version 1 stored the dense [L, N] predecessor trees instead of the packed paths
+FORMAT_VERSION = 2
+
+
+def dijkstra_to_targets(G, source, targets=None, cutoff=None, weight='length'):
+    """Dijkstra from `source`, settling every node up to the `cutoff` distance, or up to
+        the distance of the farthest of `targets` (every reachable node if neither is set).
+
+        Return the distances of the settled nodes, the parents and the number of settled nodes.
+    """
+    distances = {source: 0}
+    parents = {source: None}
+    settled = {}
+    remaining = set(targets) if targets else None
+    heap = [(0, source)]
+    while heap:
+        distance, node = heappop(heap)
+        if node in settled:
+            continue
+        if cutoff is not None and distance > cutoff:
+            break
+        settled[node] = distance
+        if remaining is not None:
+            remaining.discard(node)
+            if not remaining:
+                # Settle the nodes at the same distance as the last target, then stop
+                remaining = None
+                cutoff = distance if cutoff is None else min(cutoff, distance)
+        for neighbour, edge in G[node].items():
+            if neighbour in settled:
+                continue
+            neighbour_distance = distance + edge.get(weight, 1)
+            if neighbour_distance < distances.get(neighbour, float('inf')):
+                distances[neighbour] = neighbour_distance
+                parents[neighbour] = node
+                heappush(heap, (neighbour_distance, neighbour))
+    return settled, parents, len(settled)
+
+
+def tree_path(parents, node):
+    """Return the path from the root of the `parents` tree to `node`"""
+    path = [node]
+    while parents[path[-1]] is not None:
+        path.append(parents[path[-1]])
+    path.reverse()
+    return path
+
+
+def pair_index(i, j, number_of_landmarks):
+    """Return the index of the landmark pair i < j in the packed paths"""
+    return i * number_of_landmarks - i * (i + 1) // 2 + j - i - 1
+
+
+class LandmarkMatrix(object):
+    """Landmark to landmark network distances and paths, see the module docstring."""
+
+    def __init__(self, nodes, landmarks, distances, path_offsets=None, path_nodes=None):
+        self.nodes = np.asarray(nodes, dtype=np.float64).reshape(-1, 2)
+        self.landmarks = np.asarray(landmarks, dtype=np.float64).reshape(-1, 2)
+        self.distances = distances
+        self.path_offsets = path_offsets
+        self.path_nodes = path_nodes
+        self.node_index = {(x, y): i for i, (x, y) in enumerate(self.nodes.tolist())}
+        self.landmark_index = {(x, y): i for i, (x, y) in enumerate(self.landmarks.tolist())}
+
+    @property
+    def with_paths(self):
+        return self.path_offsets is not None
+
+    @classmethod
+    def build(cls, G, landmark_nodes=None, with_paths=True, weight='length'):
+        """Compute the distances (and paths) between the landmarks of `G`"""
+        from graph_index import get_graph_index
+        if landmark_nodes is None:
+            landmark_nodes = get_graph_index(G).landmark_nodes
+        landmark_nodes = list(landmark_nodes)
+        nodes = sorted(G.nodes)
+        node_index = {node: i for i, node in enumerate(nodes)}
+        number_of_landmarks = len(landmark_nodes)
+        distances = np.full((number_of_landmarks, number_of_landmarks), np.inf, dtype=np.float32)
+        np.fill_diagonal(distances, 0)
+        path_offsets = path_nodes = None
+        if with_paths:
+            path_offsets = np.zeros(number_of_landmarks * (number_of_landmarks - 1) // 2 + 1, dtype=np.int64)
+            path_nodes = []
+        for i, landmark in enumerate(landmark_nodes[:-1]):
+            # The graph is undirected, only the pairs with the next landmarks are searched
+            node_distances, parents, _ = dijkstra_to_targets(G, landmark, landmark_nodes[i + 1:], weight=weight)
+            for j in range(i + 1, number_of_landmarks):
+                other = landmark_nodes[j]
+                if other in node_distances:
+                    distances[i, j] = distances[j, i] = node_distances[other]
+                if with_paths:
+                    if other in node_distances:
+                        path_nodes.extend(node_index[node] for node in tree_path(parents, other))
+                    k = pair_index(i, j, number_of_landmarks)
+                    path_offsets[k + 1] = len(path_nodes)
+        if with_paths:
+            path_nodes = np.array(path_nodes, dtype=np.int32)
+        return cls(nodes, landmark_nodes, distances, path_offsets, path_nodes)
+
+    def save(self, output_path, dataset_signature=None):
+        """Write the matrix as `.npy` files in the directory `output_path`"""
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        np.save(os.path.join(output_path, 'nodes.npy'), self.nodes)
+        np.save(os.path.join(output_path, 'landmarks.npy'), self.landmarks)
+        np.save(os.path.join(output_path, 'distances.npy'), self.distances)
+        if self.with_paths:
+            np.save(os.path.join(output_path, 'path_offsets.npy'), self.path_offsets)
+            np.save(os.path.join(output_path, 'path_nodes.npy'), self.path_nodes)
+        with open(os.path.join(output_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'format_version': FORMAT_VERSION,
+                'number_of_landmarks': len(self.landmarks),
+                'with_paths': self.with_paths,
+                'dataset_signature': dataset_signature,
+            }, f)
+        return output_path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load the matrix in the directory `path`, the paths memory-mapped"""
+        path_offsets = path_nodes = None
+        if os.path.exists(os.path.join(path, 'path_offsets.npy')):
+            path_offsets = np.load(os.path.join(path, 'path_offsets.npy'))
+            path_nodes = np.load(os.path.join(path, 'path_nodes.npy'), mmap_mode=mmap_mode)
+        return cls(
+            np.load(os.path.join(path, 'nodes.npy')),
+            np.load(os.path.join(path, 'landmarks.npy')),
+            np.load(os.path.join(path, 'distances.npy')),
+            path_offsets,
+            path_nodes,
+        )
+
+    def landmark_path(self, i, j):
+        """Return the path (node keys) from the landmark `i` to the landmark `j`"""
+        if not self.with_paths:
+            raise RuntimeError('The landmark matrix has no paths, build it with `with_paths`')
+        if i == j:
+            return [tuple(self.landmarks[i].tolist())]
+        k = pair_index(min(i, j), max(i, j), len(self.landmarks))
+        path = self.path_nodes[self.path_offsets[k]:self.path_offsets[k + 1]]
+        if not len(path):
+            raise nx.NetworkXNoPath('Landmark %s not reachable from %s' % (j, i))
+        if i > j:
+            path = path[::-1]
+        return [tuple(point) for point in self.nodes[path].tolist()]
+
+    def landmark_leg(self, u, v):
+        """Return the path and length of the leg between the landmark nodes `u` and `v`,
+            or None if one of them is not a landmark of the matrix.
+        """
+        i, j = self.landmark_index.get(u), self.landmark_index.get(v)
+        if i is None or j is None:
+            return None
+        return self.landmark_path(i, j), float(self.distances[i, j])
+
+    def uses_edge(self, u, v):
+        """Return True if a landmark to landmark path walks the edge between the nodes `u` and `v`"""
+        if not self.with_paths:
+            raise RuntimeError('The landmark matrix has no paths, build it with `with_paths`')
+        i, j = self.node_index.get(u), self.node_index.get(v)
+        if i is None or j is None:
+            return False
+        path_nodes = self.path_nodes
+        positions = np.flatnonzero(path_nodes == i)
+        if not len(positions):
+            return False
+        # Only the neighbours of `u` in the same path
+        paths = np.searchsorted(self.path_offsets, positions, side='right') - 1
+        after = positions + 1 < self.path_offsets[paths + 1]
+        before = positions > self.path_offsets[paths]
+        next_nodes = path_nodes[np.minimum(positions + 1, len(path_nodes) - 1)]
+        previous_nodes = path_nodes[positions - 1]
+        return bool((after & (next_nodes == j)).any() or (before & (previous_nodes == j)).any())
+
+
+def get_landmark_matrix(G, with_paths=True):
+    """Return the landmark matrix of `G`, loaded from its dataset or built (and saved) once"""
+    from graph_index import graph_signature
+    from graph_store import derived_directory, write_derived_directory
+    signature = graph_signature(G)
+    cached = G.graph.get('landmark_matrix')
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    matrix = None
+    # A matrix on disk is only valid for the unchanged dataset
+    path, source_signature = derived_directory(G, LANDMARK_DIRECTORY)
+    if path and os.path.exists(os.path.join(path, 'meta.json')):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if (meta.get('format_version') == FORMAT_VERSION and meta.get('dataset_signature') == source_signature
+                and (meta['with_paths'] or not with_paths)):
+            matrix = LandmarkMatrix.load(path)
+    if matrix is None:
+        matrix = LandmarkMatrix.build(G, with_paths=with_paths)
+        if path:
+            write_derived_directory(path, lambda directory: matrix.save(directory, source_signature))
+    G.graph['landmark_matrix'] = (signature, matrix)
+    return matrix
+
+
+if __name__ == "__main__":
+    from graph_store import load_graph
+
+    input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/topic_data'
+    G = load_graph(input_data_path)
+    matrix = get_landmark_matrix(G)
+    print('Number of landmarks: %s' % len(matrix.landmarks))
+    print('fin')
@@ -0,0 +1,134 @@
+"""
+Bounded LRU cache of shortest path legs, shared by the routing modules so a
+leg between the same two nodes is searched only once.
+
+An entry is keyed on (graph id, graph version, from-node, to-node, weight) and
+holds the path and its length. The cache is bounded both by the number of
+entries and by the total number of path nodes it holds.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import count
+
+MAX_ENTRIES = 10000
+MAX_NODES = 1000000
+
+_graph_ids = count()
+# Cache used by the routing modules when no cache is given, see `enable_leg_cache`
+_default_leg_cache = None
+
+
+def graph_key(G):
+    """Return the (graph id, version) of `G`, different for every graph and version"""
+    if 'graph_id' not in G.graph:
+        G.graph['graph_id'] = next(_graph_ids)
+    return (G.graph['graph_id'], G.graph.get('version', 0))
+
+
+class LegCache(object):
+    """LRU cache of (path, length) legs, see the module docstring."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_nodes=MAX_NODES):
+        self.max_entries = max_entries
+        self.max_nodes = max_nodes
+        self._entries = OrderedDict()
+        self.number_of_nodes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(G, source, target, weight='length'):
+        """Return the cache key of the leg from `source` to `target` in `G`"""
+        return graph_key(G) + (source, target, weight)
+
+    def get(self, key):
+        """Return the (path, length) of `key`, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, path, length):
+        """Store the leg `path` and its `length` under `key`"""
+        path = tuple(path)
+        if len(path) > self.max_nodes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.number_of_nodes -= len(previous[0])
+        self._entries[key] = (path, length)
+        self.number_of_nodes += len(path)
+        while len(self._entries) > self.max_entries or self.number_of_nodes > self.max_nodes:
+            _, (evicted_path, _) = self._entries.popitem(last=False)
+            self.number_of_nodes -= len(evicted_path)
+            self.evictions += 1
+
+    def invalidate(self, predicate):
+        """Remove the entries for which predicate(key, path, length) is true, return their number"""
+        keys = [key for key, (path, length) in self._entries.items() if predicate(key, path, length)]
+        for key in keys:
+            path, _ = self._entries.pop(key)
+            self.number_of_nodes -= len(path)
+        return len(keys)
+
+    def rekey(self, old_graph_key, new_graph_key):
+        """Move the entries of `old_graph_key` to `new_graph_key` (see `graph_key`), keeping their order"""
+        size = len(old_graph_key)
+        self._entries = OrderedDict(
+            (new_graph_key + key[size:] if key[:size] == old_graph_key else key, entry)
+            for key, entry in self._entries.items()
+        )
+
+    def clear(self):
+        """Remove every entry"""
+        self._entries.clear()
+        self.number_of_nodes = 0
+
+    def stats(self):
+        """Return the counters of the cache as a dictionary"""
+        return {
+            'entries': len(self._entries),
+            'nodes': self.number_of_nodes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def enable_leg_cache(max_entries=MAX_ENTRIES, max_nodes=MAX_NODES):
+    """Use a shared leg cache in the routing modules and return it"""
+    global _default_leg_cache
+    _default_leg_cache = LegCache(max_entries, max_nodes)
+    return _default_leg_cache
+
+
+def disable_leg_cache():
+    """Stop using the shared leg cache in the routing modules"""
+    global _default_leg_cache
+    _default_leg_cache = None
+
+
+@contextmanager
+def shared_leg_cache(leg_cache):
+    """Use `leg_cache` as the shared leg cache in the block, then restore the previous one"""
+    global _default_leg_cache
+    previous = _default_leg_cache
+    _default_leg_cache = leg_cache
+    try:
+        yield leg_cache
+    finally:
+        _default_leg_cache = previous
+
+
+def get_leg_cache(leg_cache=None):
+    """Return `leg_cache`, or the shared leg cache if it is enabled"""
+    if leg_cache is not None:
+        return leg_cache
+    return _default_leg_cache
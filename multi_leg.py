@@ -0,0 +1,115 @@
+"""
+Multi-leg routing through waypoints (e.g. the transit landmarks of
+`a_star_landmark`) that shares one search between two consecutive legs.
+
+On an undirected graph the leg from w[i-1] to w[i] is the reverse of the path
+from w[i] to w[i-1]. A single A* search from w[i] first runs towards w[i-1],
+then continues towards w[i+1]: the open nodes are keyed again with the
+heuristic to w[i+1], and the nodes already settled (around w[i]) are not
+expanded again. With a consistent heuristic the settled distances stay exact,
+so each leg costs at most the nodes a new A* search would expand, minus the
+nodes the first target already settled.
+"""
+from heapq import heappush, heappop, heapify
+
+import networkx as nx
+
+from utils import calculate_distance
+
+
+def _continued_search(G, source, targets, heuristic=calculate_distance, weight='length'):
+    """A* from `source` to each node of `targets` in turn, continuing the same search.
+
+        Return the paths and lengths from `source` to each target, and the number
+        of nodes expanded for each target.
+    """
+    distances = {source: 0}
+    parents = {source: None}
+    settled = set()
+    paths = []
+    lengths = []
+    expanded_counts = []
+    for target in targets:
+        expanded = 0
+        if target not in settled:
+            # Open nodes keyed with the heuristic to the new target
+            heap = [(distance + heuristic(node, target), node) for node, distance in distances.items() if node not in settled]
+            heapify(heap)
+            while heap:
+                _, node = heappop(heap)
+                if node in settled:
+                    continue
+                if node == target:
+                    break
+                settled.add(node)
+                expanded += 1
+                distance = distances[node]
+                for neighbour, edge in G[node].items():
+                    if neighbour in settled:
+                        continue
+                    neighbour_distance = distance + edge.get(weight, 1)
+                    if neighbour_distance < distances.get(neighbour, float('inf')):
+                        distances[neighbour] = neighbour_distance
+                        parents[neighbour] = node
+                        heappush(heap, (neighbour_distance + heuristic(neighbour, target), neighbour))
+            else:
+                raise nx.NetworkXNoPath('Node %s not reachable from %s' % (target, source))
+        paths.append(_path_to(parents, target))
+        lengths.append(distances[target])
+        expanded_counts.append(expanded)
+    return paths, lengths, expanded_counts
+
+
+def _path_to(parents, node):
+    """Return the path from the search source to `node`"""
+    path = [node]
+    while parents[path[-1]] is not None:
+        path.append(parents[path[-1]])
+    path.reverse()
+    return path
+
+
+def multi_leg_search(G, waypoints, heuristic=calculate_distance, weight='length'):
+    """Return the path through `waypoints`, its length, number of expanded nodes and the legs.
+
+        Each leg is a dictionary with its `start`, `end`, `length`, `expanded` (nodes
+        expanded by the shared search for this leg) and `search` (index of the
+        shared search).
+    """
+    number_of_legs = len(waypoints) - 1
+    legs = [None] * number_of_legs
+    search_index = 0
+    # Search from every other waypoint, each search gives the legs on both of its sides
+    for i in range(1, number_of_legs + 1, 2):
+        source = waypoints[i]
+        targets = [waypoints[i - 1]]
+        if i < number_of_legs:
+            targets.append(waypoints[i + 1])
+        paths, lengths, expanded_counts = _continued_search(G, source, targets, heuristic, weight)
+
+        paths[0].reverse()
+        legs[i - 1] = {
+            'start': waypoints[i - 1],
+            'end': source,
+            'path': paths[0],
+            'length': lengths[0],
+            'expanded': expanded_counts[0],
+            'search': search_index,
+        }
+        if i < number_of_legs:
+            legs[i] = {
+                'start': source,
+                'end': waypoints[i + 1],
+                'path': paths[1],
+                'length': lengths[1],
+                'expanded': expanded_counts[1],
+                'search': search_index,
+            }
+        search_index += 1
+
+    full_path = [waypoints[0]]
+    for leg in legs:
+        full_path.extend(leg.pop('path')[1:])
+    length = sum(leg['length'] for leg in legs)
+    expanded = sum(leg['expanded'] for leg in legs)
+    return full_path, length, expanded, legs
@@ -3,7 +3,7 @@ if __name__ == "__main__":
     from qgis.PyQt.QtCore import QVariant
     from qgis.core import QgsApplication, QgsVectorLayer, QgsPointXY, QgsField
 
-    from qgis_utils import get_nearest_feature, get_nearest_features, get_nearest_feature_buffer
+    from qgis_utils import get_nearest_feature, get_nearest_features, get_nearest_feature_buffer, LayerSnapper
     
     QgsApplication.setPrefixPath('/usr', True)
     qgs = QgsApplication([], False)
@@ -36,6 +36,9 @@ if __name__ == "__main__":
         node_layer.changeAttributeValue(feature.id(), landmark_field_index, False)
     node_layer.commitChanges()
 
+    # Build the spatial index of the nodes once for all landmarks
+    node_snapper = LayerSnapper(node_layer)
+
     node_layer.startEditing()
     # Get all polygon that is a landmark
     if landmark_file == extracted_landmark:
@@ -51,7 +54,7 @@ if __name__ == "__main__":
         if not buffer_mode:
             if one_landmark_one_node:
                 # Get all nearest node for each landmark
-                nearest_node = get_nearest_feature(node_layer, feature.geometry().centroid().asPoint())
+                nearest_node = get_nearest_feature(node_snapper, feature.geometry().centroid().asPoint())
                 # Set the value of landmark_status to True for the nearest node
                 node_layer.changeAttributeValue(nearest_node.id(), landmark_field_index, 1)
                 if landmark_file == extracted_landmark:
@@ -61,7 +64,7 @@ if __name__ == "__main__":
                 j += 1
             else:
                 # Get all nearest node for each landmark
-                nearest_nodes = get_nearest_features(node_layer, feature.geometry().centroid().asPoint(), 10, 50)
+                nearest_nodes = get_nearest_features(node_snapper, feature.geometry().centroid().asPoint(), 10, 50)
                 if not nearest_nodes:
                     print('=================================')
                 for nearest_node in nearest_nodes:
@@ -74,7 +77,7 @@ if __name__ == "__main__":
                     j += 1
         else:
             # Using buffer
-            nearest_nodes = get_nearest_feature_buffer(node_layer, feature, buffer_distance)
+            nearest_nodes = get_nearest_feature_buffer(node_snapper, feature, buffer_distance)
             if not nearest_nodes:
                 print('>>>>> No nearest nodes from buffer')
             for nearest_node in nearest_nodes:
@@ -4,37 +4,63 @@ from qgis.core import (
     QgsSpatialIndex
 )
 
-def create_spatial_index(layer):
-    # Select all features along with their attributes
-    all_features = {feature.id(): feature for (feature) in layer.getFeatures()}
+def create_spatial_index(layer, features=None):
+    """Create spatial index of a `layer`, or of its `features` if they are already read"""
+    if features is None:
+        # Select all features along with their attributes
+        features = layer.getFeatures()
     # Create spatial index
     spatial_index = QgsSpatialIndex()
-    for f in all_features.values():
+    for f in features:
         spatial_index.addFeature(f)
     return spatial_index
 
+class LayerSnapper(object):
+    """Spatial index and features of a `layer`, built once to answer many nearest queries"""
+
+    def __init__(self, layer):
+        self.layer = layer
+        # Select all features along with their attributes
+        self.features = {feature.id(): feature for (feature) in layer.getFeatures()}
+        self.spatial_index = create_spatial_index(layer, self.features.values())
+
+    def nearest_feature(self, point):
+        """Return the nearest feature from `point`"""
+        nearest_id = self.spatial_index.nearestNeighbor(point)[0] # we need only one neighbour
+        return self.features[nearest_id]
+
+    def nearest_features(self, point, num_points=1, max_distance=0):
+        """Return the `num_points` nearest features from `point` within `max_distance`"""
+        nearest_ids = self.spatial_index.nearestNeighbor(point, num_points, max_distance)
+        return [self.features[nearest_id] for nearest_id in nearest_ids]
+
+    def buffer_features(self, the_feature, buffer_distance):
+        """Return the features located near a buffer with distance of a polygon"""
+        buffer = the_feature.geometry().buffer(buffer_distance, 5)
+        intersect_indexes = self.spatial_index.intersects(buffer.boundingBox())
+        return [self.features[intersect_index] for intersect_index in intersect_indexes]
+
+    def snap_points(self, points):
+        """Return the nearest feature for each point of `points`"""
+        return [self.nearest_feature(point) for point in points]
+
+def get_snapper(layer):
+    """Return `layer` if it is a LayerSnapper, else a new LayerSnapper of `layer`"""
+    if isinstance(layer, LayerSnapper):
+        return layer
+    return LayerSnapper(layer)
+
 def get_nearest_feature(layer, point):
-    """Helper to get nearest feature of a `layer` from `point`"""
-    all_features = {feature.id(): feature for (feature) in layer.getFeatures()}
-    spatial_index = create_spatial_index(layer)
-    nearest_id = spatial_index.nearestNeighbor(point)[0] # we need only one neighbour
-    return all_features[nearest_id]
+    """Helper to get nearest feature of a `layer` (or LayerSnapper) from `point`"""
+    return get_snapper(layer).nearest_feature(point)
 
 def get_nearest_features(layer, point, num_points=1, max_distance=0):
-    """Helper to get nearest feature of a `layer` from `point`"""
-    all_features = {feature.id(): feature for (feature) in layer.getFeatures()}
-    spatial_index = create_spatial_index(layer)
-    nearest_ids = spatial_index.nearestNeighbor(point, num_points, max_distance) # we need only one neighbour
-    return [all_features[nearest_id] for nearest_id in nearest_ids]
+    """Helper to get nearest feature of a `layer` (or LayerSnapper) from `point`"""
+    return get_snapper(layer).nearest_features(point, num_points, max_distance)
 
 def get_nearest_feature_buffer(layer, the_feature, buffer_distance):
-    """Get the points which located near a buffer with distance of a polygon"""
-    all_features = {feature.id(): feature for (feature) in layer.getFeatures()}
-    spatial_index = create_spatial_index(layer)
-
-    buffer = the_feature.geometry().buffer(buffer_distance, 5)
-    intersect_indexes = spatial_index.intersects(buffer.boundingBox())
-    return [all_features[intersect_index] for intersect_index in intersect_indexes]
+    """Get the points of a `layer` (or LayerSnapper) which located near a buffer with distance of a polygon"""
+    return get_snapper(layer).buffer_features(the_feature, buffer_distance)
 
 if __name__ == "__main__":
     from qgis.core import QgsApplication, QgsVectorLayer, QgsPointXY
@@ -48,11 +74,14 @@ if __name__ == "__main__":
     if not node_layer.isValid():
         print('Node layer is not valid.')
 
+    # Build the spatial index once for all queries
+    node_snapper = LayerSnapper(node_layer)
+
     point = QgsPointXY(404362.77, 5757893.31)
-    nearest_node = get_nearest_feature(node_layer, point)
+    nearest_node = get_nearest_feature(node_snapper, point)
     print(nearest_node['nodeID'])
 
     point = QgsPointXY(404362.77, 5757893.31)
-    nearest_nodes = get_nearest_features(node_layer, point, 5, 20)
+    nearest_nodes = get_nearest_features(node_snapper, point, 5, 20)
     for n in nearest_nodes:
         print(n['nodeID'])
@@ -0,0 +1,85 @@
+"""
+Route geometry from the per-edge coordinates of the graph.
+
+The coordinates of every edge are parsed once from its `Json` attribute, when
+the graph is read, into a float64 [n, 2] array in the `coordinates` attribute.
+The line of a route is then stitched as views of these arrays (reversed where
+the edge is walked backwards) concatenated into one float64 buffer, and only
+converted to an OGR geometry when it is written.
+"""
+import json
+import struct
+
+import numpy as np
+
+EDGE_COORDINATES = 'coordinates'
+# WKB header of a little endian 2D LineString: byte order, geometry type, number of points
+WKB_LINESTRING_HEADER = struct.Struct('<BII')
+
+
+def parse_edge_coordinates(G, attribute='Json'):
+    """Parse the coordinates of every edge of `G` into its `coordinates` attribute"""
+    for u, v, data in G.edges(data=True):
+        if attribute in data:
+            points = np.array(json.loads(data[attribute])['coordinates'], dtype=np.float64)[:, :2]
+        else:
+            points = np.array([u, v], dtype=np.float64)
+        data[EDGE_COORDINATES] = points
+
+
+def edge_coordinates(G, u, v):
+    """Return the coordinates of the edge (u, v) of `G` from `u` to `v`, a view of the edge array"""
+    data = G[u][v]
+    points = data.get(EDGE_COORDINATES)
+    if points is None:
+        # Graph not read with `graph_store.read_graph`, parse the edge now
+        if 'Json' in data:
+            points = np.array(json.loads(data['Json'])['coordinates'], dtype=np.float64)[:, :2]
+        else:
+            points = np.array([u, v], dtype=np.float64)
+        data[EDGE_COORDINATES] = points
+    # The edge is digitised in either direction, start from the end closest to `u`
+    first, last = points[0], points[-1]
+    if (first[0] - u[0]) ** 2 + (first[1] - u[1]) ** 2 > (last[0] - u[0]) ** 2 + (last[1] - u[1]) ** 2:
+        return points[::-1]
+    return points
+
+
+def path_coordinates(G, path, start_point=None, end_point=None):
+    """Return the line of `path` (list of node keys of `G`) as a float64 [n, 2] array.
+
+        `start_point` and `end_point` are (x, y) points added before and after the path.
+    """
+    parts = []
+    if start_point is not None:
+        parts.append(np.array([start_point], dtype=np.float64))
+    for i in range(len(path) - 1):
+        points = edge_coordinates(G, path[i], path[i + 1])
+        # The first vertex of an edge is the last vertex of the previous one
+        parts.append(points if i == 0 else points[1:])
+    if end_point is not None:
+        parts.append(np.array([end_point], dtype=np.float64))
+    if not parts:
+        return np.empty((0, 2), dtype=np.float64)
+    return np.concatenate(parts)
+
+
+def linestring_wkb(coordinates):
+    """Return the WKB of the line through `coordinates`, a [n, 2] array"""
+    coordinates = np.ascontiguousarray(coordinates, dtype='<f8')
+    return WKB_LINESTRING_HEADER.pack(1, 2, len(coordinates)) + coordinates.tobytes()
+
+
+def linestring_geometry(coordinates):
+    """Return the line through `coordinates`, a [n, 2] array, as an OGR geometry"""
+    from osgeo import ogr
+    return ogr.CreateGeometryFromWkb(linestring_wkb(coordinates))
+
+
+def geojson_feature(coordinates, properties=None):
+    """Return the line through `coordinates`, a [n, 2] array, as a GeoJSON feature dictionary"""
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'LineString', 'coordinates': np.asarray(coordinates).tolist()},
+        'properties': properties or {},
+    }
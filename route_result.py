@@ -0,0 +1,37 @@
+"""
+Result of a routing algorithm, the output of a single search.
+"""
+
+
+class RouteResult(object):
+    """Route found by a routing algorithm.
+
+        `path` : list of node keys from the start to the end node.
+        `length` : total `length` of the path.
+        `expanded` : number of nodes expanded by the search(es).
+        `elapsed` : routing time in seconds.
+        `algorithm` : name of the algorithm.
+        `legs` : list of per leg summaries (dictionaries) of a multi-leg route.
+    """
+
+    def __init__(self, path, length, expanded=0, elapsed=0.0, algorithm='', legs=None):
+        self.path = path
+        self.length = length
+        self.expanded = expanded
+        self.elapsed = elapsed
+        self.algorithm = algorithm
+        self.legs = legs or []
+
+    def __repr__(self):
+        return '<RouteResult %s: %d nodes, length %f, %d expanded, %f s>' % (
+            self.algorithm, len(self.path), self.length, self.expanded, self.elapsed)
+
+    def to_dict(self):
+        """Return the summary of the route (without the path) as a dictionary"""
+        return {
+            'algorithm': self.algorithm,
+            'length': self.length,
+            'expanded': self.expanded,
+            'elapsed': self.elapsed,
+            'number_of_nodes': len(self.path),
+        }
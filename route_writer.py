@@ -0,0 +1,125 @@
+"""
+Writer of many routes into a single GeoPackage or FlatGeobuf layer.
+
+The datasource is opened once, the routes are written as features (with the
+route id, algorithm name, length, number of expanded nodes and routing time)
+in transactions of `batch_size` features, instead of one shapefile per route.
+"""
+import os
+
+from osgeo import ogr
+
+from route_geometry import path_coordinates, linestring_geometry
+
+BATCH_SIZE = 1000
+DRIVERS = {
+    '.gpkg': 'GPKG',
+    '.fgb': 'FlatGeobuf',
+}
+FIELDS = (
+    ('route_id', ogr.OFTString),
+    ('algorithm', ogr.OFTString),
+    ('length', ogr.OFTReal),
+    ('expanded', ogr.OFTInteger64),
+    ('elapsed', ogr.OFTReal),
+)
+
+
+class RouteWriter(object):
+    """Write `RouteResult`s as features of the layer `layer_name` of `output_file`.
+
+        The driver is picked from the extension of `output_file` (`.gpkg` or
+        `.fgb`), an existing file is replaced. Use it as a context manager, or
+        call `close` to write the last batch.
+    """
+
+    def __init__(self, output_file, spatial_reference=None, layer_name='routes', batch_size=BATCH_SIZE):
+        extension = os.path.splitext(output_file)[1].lower()
+        if extension not in DRIVERS:
+            raise ValueError('Unsupported route output format %s, use one of %s' % (extension, ', '.join(DRIVERS)))
+        driver = ogr.GetDriverByName(DRIVERS[extension])
+        if os.path.exists(output_file):
+            driver.DeleteDataSource(output_file)
+        self.output_file = output_file
+        self.batch_size = batch_size
+        self.data_source = driver.CreateDataSource(output_file)
+        if self.data_source is None:
+            raise RuntimeError('Unable to create {}'.format(output_file))
+        self.layer = self.data_source.CreateLayer(layer_name, spatial_reference, ogr.wkbLineString)
+        for name, field_type in FIELDS:
+            self.layer.CreateField(ogr.FieldDefn(name, field_type))
+        self.layer_definition = self.layer.GetLayerDefn()
+        self.transactions = bool(self.data_source.TestCapability(ogr.ODsCTransactions))
+        self.number_of_routes = 0
+        self._pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, route_id, result, G=None, coordinates=None):
+        """Write the route `result` with id `route_id`.
+
+            The geometry is `coordinates` (a [n, 2] array), or the line of the
+            path of `result` in the graph `G`.
+        """
+        if coordinates is None:
+            coordinates = path_coordinates(G, result.path)
+        if self._pending == 0 and self.transactions:
+            self.data_source.StartTransaction()
+        feature = ogr.Feature(self.layer_definition)
+        feature.SetField('route_id', str(route_id))
+        feature.SetField('algorithm', result.algorithm)
+        feature.SetField('length', result.length)
+        feature.SetField('expanded', result.expanded)
+        feature.SetField('elapsed', result.elapsed)
+        feature.SetGeometry(linestring_geometry(coordinates))
+        self.layer.CreateFeature(feature)
+        feature = None
+        self.number_of_routes += 1
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def write_results(self, results, G):
+        """Write the (route id, RouteResult) of `results` (e.g. `batch.route_many`), skip the None results"""
+        for route_id, result in results:
+            if result is not None:
+                self.write(route_id, result, G)
+
+    def flush(self):
+        """Commit the current batch of routes"""
+        if self._pending and self.transactions:
+            self.data_source.CommitTransaction()
+        else:
+            self.layer.SyncToDisk()
+        self._pending = 0
+
+    def close(self):
+        """Write the last batch and close the datasource"""
+        if self.data_source is None:
+            return
+        self.flush()
+        self.layer = None
+        self.data_source = None
+
+
+if __name__ == "__main__":
+    from batch import load_input_data, route_many
+    from utils import get_spatial_reference
+
+    input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/topic_data'
+    output_file = '/home/ismailsunni/dev/python/routing/test/output/routes.gpkg'
+    route_pairs = [
+        (4063, 33),
+        (6492, 3858),
+        (870, 3102),
+    ]
+    G = load_input_data(input_data_path)
+    with RouteWriter(output_file, get_spatial_reference(input_data_path)) as writer:
+        for algorithm in ['a_star', 'a_star_landmark']:
+            writer.write_results(route_many(route_pairs, algorithm, G, workers=2), G)
+        print('Number of routes: %s' % writer.number_of_routes)
+    print('fin')
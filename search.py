@@ -0,0 +1,176 @@
+"""
+Shortest path searches over a networkx graph that report the path, its length
+and the number of expanded nodes from a single search.
+"""
+from heapq import heappush, heappop
+from itertools import count
+
+import networkx as nx
+
+from utils import calculate_distance
+from instrumentation import get_metrics
+
+
+def astar_search(G, source, target, heuristic=calculate_distance, weight='length'):
+    """Return the path, length and number of expanded nodes from `source` to `target`.
+
+        Same search (and tie breaking) as `nx.astar_path`, so the path is the same,
+        but the length is known without running `nx.astar_path_length`.
+    """
+    c = count()
+    queue = [(0, next(c), source, 0, None)]
+    # Maps enqueued nodes to distance of discovered paths and the heuristic
+    enqueued = {}
+    # Maps explored nodes to parent closest to the source
+    explored = {}
+    expanded = 0
+
+    while queue:
+        _, __, current_node, distance, parent = heappop(queue)
+
+        if current_node == target:
+            path = [current_node]
+            node = parent
+            while node is not None:
+                path.append(node)
+                node = explored[node]
+            path.reverse()
+            metrics = get_metrics()
+            if metrics is not None:
+                # Every push took a value of `c`
+                metrics.count('heap_pushes', next(c))
+            return path, distance, expanded
+
+        if current_node in explored:
+            # Do not override the parent of the source
+            if explored[current_node] is None:
+                continue
+            # Skip bad paths that were enqueued before finding a better one
+            queue_cost, h = enqueued[current_node]
+            if queue_cost < distance:
+                continue
+
+        explored[current_node] = parent
+        expanded += 1
+
+        for neighbour, edge in G[current_node].items():
+            neighbour_cost = distance + edge.get(weight, 1)
+            if neighbour in enqueued:
+                queue_cost, h = enqueued[neighbour]
+                if queue_cost <= neighbour_cost:
+                    continue
+            else:
+                h = heuristic(neighbour, target)
+            enqueued[neighbour] = neighbour_cost, h
+            heappush(queue, (neighbour_cost + h, next(c), neighbour, neighbour_cost, current_node))
+
+    raise nx.NetworkXNoPath('Node %s not reachable from %s' % (target, source))
+
+
+def bidirectional_astar_search(G, source, target, heuristic=calculate_distance, weight='length'):
+    """Return the path, length and number of expanded nodes from `source` to `target`
+        with a bidirectional A* search on the undirected graph `G`.
+
+        Both searches use the averaged potential p(v) = (h(v, target) - h(v, source)) / 2
+        (forward) and -p(v) (backward), which is consistent when `heuristic` is, and
+        they stop when the sum of their smallest keys reaches the best path found.
+        The length is the same as `astar_search`, and so is the path unless several
+        shortest paths exist.
+    """
+    if source == target:
+        return [source], 0, 0
+    potentials = {}
+
+    def potential(node):
+        """Forward potential of `node`, the backward potential is the opposite"""
+        p = potentials.get(node)
+        if p is None:
+            p = (heuristic(node, target) - heuristic(node, source)) / 2.0
+            potentials[node] = p
+        return p
+
+    c = count()
+    inf = float('inf')
+    distances = ({source: 0}, {target: 0})
+    parents = ({source: None}, {target: None})
+    explored = (set(), set())
+    queues = ([(potential(source), next(c), source)], [(-potential(target), next(c), target)])
+    signs = (1, -1)
+    best = inf
+    meeting_node = None
+    expanded = 0
+
+    while queues[0] and queues[1]:
+        if queues[0][0][0] + queues[1][0][0] >= best:
+            break
+        # Expand the side with the smallest key
+        side = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+        _, __, current_node = heappop(queues[side])
+        side_explored = explored[side]
+        if current_node in side_explored:
+            continue
+        side_explored.add(current_node)
+        expanded += 1
+
+        side_distances = distances[side]
+        other_distances = distances[1 - side]
+        side_parents = parents[side]
+        sign = signs[side]
+        distance = side_distances[current_node]
+        for neighbour, edge in G[current_node].items():
+            if neighbour in side_explored:
+                continue
+            neighbour_cost = distance + edge.get(weight, 1)
+            if neighbour_cost < side_distances.get(neighbour, inf):
+                side_distances[neighbour] = neighbour_cost
+                side_parents[neighbour] = current_node
+                heappush(queues[side], (neighbour_cost + sign * potential(neighbour), next(c), neighbour))
+                if neighbour in other_distances and neighbour_cost + other_distances[neighbour] < best:
+                    best = neighbour_cost + other_distances[neighbour]
+                    meeting_node = neighbour
+
+    if meeting_node is None:
+        raise nx.NetworkXNoPath('Node %s not reachable from %s' % (target, source))
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.count('heap_pushes', next(c))
+
+    path = [meeting_node]
+    while parents[0][path[-1]] is not None:
+        path.append(parents[0][path[-1]])
+    path.reverse()
+    while parents[1][path[-1]] is not None:
+        path.append(parents[1][path[-1]])
+    return path, best, expanded
+
+
+def shortest_path_search(G, source, target, heuristic=calculate_distance, weight='length', bidirectional=False, leg_cache=None):
+    """Return the path, length and number of expanded nodes with `astar_search`,
+        or `bidirectional_astar_search` if `bidirectional` is set.
+
+        A leg found in `leg_cache` (a `leg_cache.LegCache`) is returned with no
+        expanded node.
+    """
+    metrics = get_metrics()
+    if leg_cache is not None:
+        key = leg_cache.key(G, source, target, weight)
+        cached = leg_cache.get(key)
+        if cached is not None:
+            if metrics is not None:
+                metrics.count('leg_cache_hits')
+            return list(cached[0]), cached[1], 0
+    if bidirectional:
+        path, length, expanded = bidirectional_astar_search(G, source, target, heuristic=heuristic, weight=weight)
+    else:
+        path, length, expanded = astar_search(G, source, target, heuristic=heuristic, weight=weight)
+    if metrics is not None:
+        metrics.count('nodes_settled', expanded)
+        metrics.count('searches')
+    if leg_cache is not None:
+        leg_cache.put(key, path, length)
+    return path, length, expanded
+
+
+def path_length(G, path, weight='length'):
+    """Return the total `weight` of the edges along `path`"""
+    return sum(G.edges[path[i], path[i + 1]][weight] for i in range(len(path) - 1))
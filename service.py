@@ -0,0 +1,263 @@
+"""
+Asyncio HTTP routing service over a graph loaded once.
+
+The graph is loaded before the worker processes are forked, so every worker
+shares it. The searches run in the process pool and the event loop only
+parses the requests and writes the responses. Identical requests in flight
+(same algorithm, start and end point) share a single search.
+
+    GET  /route?start=x,y&end=x,y&algorithm=a_star
+    POST /route  {"start": [x, y], "end": [x, y], "algorithm": "a_star"}
+    GET  /health
+
+A route is returned as a GeoJSON feature (the line from the start point to
+the end point, with the `RouteResult` summary as properties). See
+`service_client` for a client and a load test.
+
+    python service.py /path/to/dataset --port 8080 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import networkx as nx
+
+from algorithms import ALGORITHMS, get_algorithm
+from graph_store import get_graph
+from route_geometry import path_coordinates, geojson_feature
+from snapping import get_node_snapper
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_ALGORITHM = 'a_star'
+MAX_BODY_SIZE = 65536
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+# Graph of the worker process
+_worker = {}
+
+
+def _init_worker(input_data, node_id_attribute):
+    """Load the graph (inherited when forked) and its node snapper once per worker"""
+    G = get_graph(input_data)
+    _worker['graph'] = G
+    _worker['node_id_attribute'] = node_id_attribute
+    _worker['snapper'] = get_node_snapper(G, node_id_attribute)
+
+
+def route_points(algorithm, start_point, end_point):
+    """Return the GeoJSON feature of the route from `start_point` to `end_point`, (x, y) points"""
+    G = _worker['graph']
+    node_id_attribute = _worker['node_id_attribute']
+    start_node_value, end_node_value = _worker['snapper'].nearest_node_ids([start_point, end_point])
+    result = get_algorithm(algorithm)(
+        (node_id_attribute, start_node_value), (node_id_attribute, end_node_value), G, None)
+    properties = result.to_dict()
+    properties['start_node'] = start_node_value
+    properties['end_node'] = end_node_value
+    return geojson_feature(path_coordinates(G, result.path, start_point, end_point), properties)
+
+
+class HTTPError(Exception):
+    """Error returned to the client with the HTTP `status`"""
+
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+
+def _parse_point(value):
+    """Return the (x, y) point of `value`, a 'x,y' string or a [x, y] list"""
+    try:
+        if isinstance(value, str):
+            value = value.split(',')
+        x, y = value
+        point = (float(x), float(y))
+    except (TypeError, ValueError):
+        raise HTTPError(400, 'Invalid point %r, use x,y' % (value,))
+    if not all(math.isfinite(coordinate) for coordinate in point):
+        raise HTTPError(400, 'Invalid point %r, use finite coordinates' % (value,))
+    return point
+
+
+class RoutingService(object):
+    """Routing service over the graph of `input_data`, a dataset path or a loaded graph.
+
+        `workers` : number of worker processes, all the CPUs by default.
+        `warm_up` : names of the algorithms to run once before forking, so the
+            workers inherit their derived data (ALT tables, contraction hierarchy...).
+    """
+
+    def __init__(self, input_data, workers=None, node_id_attribute='nodeID', warm_up=()):
+        # Load the graph and its snapper before forking, the workers inherit them
+        self.graph = get_graph(input_data)
+        self.node_id_attribute = node_id_attribute
+        snapper = get_node_snapper(self.graph, node_id_attribute)
+        for algorithm in warm_up:
+            try:
+                get_algorithm(algorithm)(
+                    (node_id_attribute, snapper.node_ids[0]), (node_id_attribute, snapper.node_ids[-1]), self.graph, None)
+            except nx.NetworkXNoPath:
+                pass
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context()
+        self.executor = ProcessPoolExecutor(
+            workers, mp_context=context, initializer=_init_worker,
+            initargs=(self.graph if context.get_start_method() == 'fork' else input_data, node_id_attribute))
+        # Start the workers now, forked later they would inherit (and keep open) the client sockets
+        self.executor.submit(int).result()
+        self._in_flight = {}
+        self.requests = 0
+        self.searches = 0
+        self.coalesced = 0
+
+    async def route(self, algorithm, start_point, end_point):
+        """Return the GeoJSON feature of the route, sharing the search of an identical request in flight"""
+        if not isinstance(algorithm, str) or algorithm not in ALGORITHMS:
+            raise HTTPError(400, 'Unknown algorithm %s, use one of %s' % (algorithm, ', '.join(sorted(ALGORITHMS))))
+        self.requests += 1
+        key = (algorithm, start_point, end_point)
+        future = self._in_flight.get(key)
+        if future is None:
+            self.searches += 1
+            future = asyncio.get_running_loop().run_in_executor(
+                self.executor, route_points, algorithm, start_point, end_point)
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # A client that goes away does not cancel the search of the others
+        return await asyncio.shield(future)
+
+    def health(self):
+        """Return the state of the service as a dictionary"""
+        x, y = get_node_snapper(self.graph, self.node_id_attribute).coordinates.T
+        return {
+            'algorithms': sorted(ALGORITHMS),
+            'number_of_nodes': self.graph.number_of_nodes(),
+            'bounds': [float(x.min()), float(y.min()), float(x.max()), float(y.max())],
+            'requests': self.requests,
+            'searches': self.searches,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._in_flight),
+        }
+
+    async def handle_request(self, method, target, body):
+        """Return the status and the response dictionary of a request"""
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, self.health()
+        if url.path != '/route':
+            raise HTTPError(404, 'Unknown path %s' % url.path)
+        if method == 'GET':
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        elif method == 'POST':
+            try:
+                query = json.loads(body.decode('utf-8'))
+            except ValueError:
+                raise HTTPError(400, 'Invalid JSON body')
+            if not isinstance(query, dict):
+                raise HTTPError(400, 'The JSON body must be an object')
+        else:
+            raise HTTPError(405, 'Use GET or POST')
+        if 'start' not in query or 'end' not in query:
+            raise HTTPError(400, 'start and end are required')
+        start_point = _parse_point(query['start'])
+        end_point = _parse_point(query['end'])
+        algorithm = query.get('algorithm', DEFAULT_ALGORITHM)
+        try:
+            return 200, await self.route(algorithm, start_point, end_point)
+        except nx.NetworkXNoPath as e:
+            raise HTTPError(404, str(e))
+        except KeyError as e:
+            # Node id unknown to the algorithm
+            raise HTTPError(404, 'Unknown node: %s' % e)
+
+    async def handle_connection(self, reader, writer):
+        """Serve the HTTP/1.1 requests of a (keep-alive) connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    method, target, _ = request_line.decode('latin-1').split()
+                    content_length = int(headers.get('content-length', 0))
+                    if content_length > MAX_BODY_SIZE:
+                        raise HTTPError(400, 'Request body too large')
+                    body = await reader.readexactly(content_length) if content_length else b''
+                    status, response = await self.handle_request(method, target, body)
+                except HTTPError as e:
+                    status, response = e.status, {'error': str(e)}
+                except ValueError as e:
+                    status, response = 400, {'error': str(e)}
+                except Exception as e:
+                    logger.exception('Request %s failed', request_line)
+                    status, response = 500, {'error': str(e)}
+                content = json.dumps(response).encode('utf-8')
+                content_type = 'application/geo+json' if response.get('type') == 'Feature' else 'application/json'
+                writer.write((
+                    'HTTP/1.1 %d %s\r\n'
+                    'Content-Type: %s\r\n'
+                    'Content-Length: %d\r\n'
+                    'Connection: %s\r\n\r\n' % (
+                        status, REASONS.get(status, ''), content_type, len(content),
+                        'keep-alive' if keep_alive else 'close')
+                ).encode('latin-1') + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        """Serve the requests on `host`:`port` until cancelled"""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info('Routing service on %s:%s', host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """Stop the worker processes"""
+        self.executor.shutdown()
+
+
+if __name__ == "__main__":
+    from utils import enable_verbose_output
+    from graph_store import load_graph
+
+    parser = argparse.ArgumentParser(description='Asyncio HTTP routing service.')
+    parser.add_argument('input_data_path', help='directory with the nodes and edges layer')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--warm-up', nargs='*', default=[], choices=sorted(ALGORITHMS),
+                        help='algorithms to prepare before starting the workers')
+    args = parser.parse_args()
+
+    enable_verbose_output(level='INFO')
+    service = RoutingService(load_graph(args.input_data_path), workers=args.workers, warm_up=args.warm_up)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,146 @@
+"""
+Client and load test of the routing service (see `service`), to measure its
+throughput on one machine.
+
+The load test sends `requests` route requests between random points of the
+network bounds from `concurrency` keep-alive connections. A `repeat` share of
+the requests reuses a previous pair of points, to exercise the coalescing of
+identical requests.
+
+    python service_client.py --port 8080 --requests 1000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+class RoutingClient(object):
+    """HTTP/1.1 client of the routing service, over one keep-alive connection."""
+
+    def __init__(self, host='127.0.0.1', port=8080):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def _request(self, method, target, body=None):
+        """Send a request and return the status and the decoded JSON response"""
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        content = json.dumps(body).encode('utf-8') if body is not None else b''
+        self._writer.write((
+            '%s %s HTTP/1.1\r\n'
+            'Host: %s:%s\r\n'
+            'Content-Type: application/json\r\n'
+            'Content-Length: %d\r\n\r\n' % (method, target, self.host, self.port, len(content))
+        ).encode('latin-1') + content)
+        await self._writer.drain()
+        status = int((await self._reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        response = await self._reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, json.loads(response.decode('utf-8'))
+
+    async def route(self, start_point, end_point, algorithm='a_star'):
+        """Return the status and the GeoJSON feature of the route between two (x, y) points"""
+        return await self._request('POST', '/route', {
+            'start': list(start_point),
+            'end': list(end_point),
+            'algorithm': algorithm,
+        })
+
+    async def health(self):
+        """Return the state of the service"""
+        return (await self._request('GET', '/health'))[1]
+
+    async def close(self):
+        """Close the connection"""
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+            self._reader = None
+
+
+async def load_test(host='127.0.0.1', port=8080, algorithm='a_star', requests=1000, concurrency=32, repeat=0.1, seed=0):
+    """Run the load test (see the module docstring) and return the measures as a dictionary"""
+    client = RoutingClient(host, port)
+    min_x, min_y, max_x, max_y = (await client.health())['bounds']
+    await client.close()
+
+    rnd = random.Random(seed)
+    pairs = []
+    for _ in range(requests):
+        if pairs and rnd.random() < repeat:
+            pairs.append(rnd.choice(pairs))
+        else:
+            pairs.append(tuple(
+                (rnd.uniform(min_x, max_x), rnd.uniform(min_y, max_y)) for _ in range(2)))
+    queue = asyncio.Queue()
+    for pair in pairs:
+        queue.put_nowait(pair)
+
+    latencies = []
+    statuses = {}
+
+    async def run_client():
+        client = RoutingClient(host, port)
+        try:
+            while not queue.empty():
+                start_point, end_point = queue.get_nowait()
+                start_time = time.perf_counter()
+                status, _ = await client.route(start_point, end_point, algorithm)
+                latencies.append(time.perf_counter() - start_time)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            await client.close()
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[run_client() for _ in range(concurrency)])
+    total_time = time.perf_counter() - start_time
+
+    client = RoutingClient(host, port)
+    health = await client.health()
+    await client.close()
+    latencies = np.array(latencies)
+    report = {
+        'algorithm': algorithm,
+        'requests': requests,
+        'concurrency': concurrency,
+        'total_time': total_time,
+        'throughput': requests / total_time,
+        'statuses': statuses,
+        'service': health,
+    }
+    for percentile in PERCENTILES:
+        report['p%d_latency' % percentile] = float(np.percentile(latencies, percentile))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test of the routing service.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--algorithm', default='a_star')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--repeat', type=float, default=0.1, help='share of repeated requests')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    report = asyncio.run(load_test(
+        args.host, args.port, args.algorithm, args.requests, args.concurrency, args.repeat, args.seed))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,102 @@
+"""
+Snapping of points to the nearest graph nodes without QGIS, for headless
+routing workers.
+
+The nodes are indexed in a KD-tree (`scipy.spatial.cKDTree`) over their
+coordinates, which are the graph keys. If SciPy is not installed, the queries
+fall back to a vectorised brute force search with NumPy.
+"""
+import numpy as np
+
+# Memory budget (bytes) of the [chunk, N, 2] float64 differences of the brute force search
+BRUTE_FORCE_MEMORY = 64 * 2 ** 20
+
+
+def _kdtree_class():
+    """Return `scipy.spatial.cKDTree`, imported on first use, or None without SciPy"""
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        return None
+    return cKDTree
+
+
+class KDTreeSnapper(object):
+    """Nearest node queries over `nodes`, a list of (x, y) node keys."""
+
+    def __init__(self, nodes, node_ids=None):
+        self.nodes = list(nodes)
+        self.node_ids = node_ids
+        self.coordinates = np.array(self.nodes, dtype=np.float64).reshape(-1, 2)
+        cKDTree = _kdtree_class()
+        self.tree = cKDTree(self.coordinates) if cKDTree is not None else None
+
+    @classmethod
+    def from_graph(cls, G, attribute='nodeID'):
+        """Index the nodes of `G` that have `attribute`, like the nodes layer"""
+        nodes = [node for node, value in G.nodes(data=attribute) if value is not None]
+        return cls(nodes, node_ids=[G.node[node][attribute] for node in nodes])
+
+    def query(self, points, k=1):
+        """Return the distances and indexes of the `k` nearest nodes of each point.
+
+            `points` is a [n, 2] array-like, the result arrays are [n] if k is 1
+            else [n, k].
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        k = min(k, len(self.nodes))
+        if self.tree is not None:
+            distances, indexes = self.tree.query(points, k=k)
+            return distances, indexes
+        distances = np.empty((len(points), k))
+        indexes = np.empty((len(points), k), dtype=np.int64)
+        # Fewer query points per chunk for more nodes, the chunk arrays stay within the budget
+        chunk_size = max(1, BRUTE_FORCE_MEMORY // (max(1, len(self.nodes)) * 2 * 8))
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start:start + chunk_size]
+            squared = ((chunk[:, None, :] - self.coordinates[None, :, :]) ** 2).sum(axis=2)
+            nearest = np.argpartition(squared, k - 1, axis=1)[:, :k]
+            nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+            order = np.argsort(nearest_squared, axis=1)
+            indexes[start:start + chunk_size] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + chunk_size] = np.sqrt(np.take_along_axis(nearest_squared, order, axis=1))
+        if k == 1:
+            return distances[:, 0], indexes[:, 0]
+        return distances, indexes
+
+    def query_radius(self, points, radius):
+        """Return the list of node indexes within `radius` of each point"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.tree is not None:
+            return [np.array(indexes, dtype=np.int64) for indexes in self.tree.query_ball_point(points, radius)]
+        result = []
+        for point in points:
+            squared = ((self.coordinates - point) ** 2).sum(axis=1)
+            result.append(np.flatnonzero(squared <= radius * radius))
+        return result
+
+    def nearest_node(self, point):
+        """Return the key of the nearest node from `point`"""
+        _, indexes = self.query([point])
+        return self.nodes[indexes[0]]
+
+    def nearest_nodes(self, points):
+        """Return the key of the nearest node for each point of `points`"""
+        _, indexes = self.query(points)
+        return [self.nodes[index] for index in indexes]
+
+    def nearest_node_ids(self, points):
+        """Return the node id of the nearest node for each point of `points`"""
+        _, indexes = self.query(points)
+        return [self.node_ids[index] for index in indexes]
+
+
+def get_node_snapper(G, attribute='nodeID'):
+    """Return the KD-tree snapper of `G`, built once and kept in the graph"""
+    from graph_index import graph_signature
+    signature = graph_signature(G)
+    cached = G.graph.get('node_snapper')
+    if cached is None or cached[0] != signature or cached[1] != attribute:
+        cached = (signature, attribute, KDTreeSnapper.from_graph(G, attribute))
+        G.graph['node_snapper'] = cached
+    return cached[2]
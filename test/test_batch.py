@@ -0,0 +1,19 @@
+"""
+Tests of `batch.route_many` in this process (workers=1).
+"""
+import leg_cache
+from batch import route_many, _worker
+from benchmark import make_grid_graph, sample_pairs
+
+
+def test_in_process_leg_cache_stays_local():
+    G = make_grid_graph(8, seed=1, edge_ratio=1.0)
+    pairs = sample_pairs(G, 2) * 2
+    results = dict(route_many(pairs, 'a_star', G, workers=1, leg_cache_entries=10))
+    # The repeated pairs are served from the leg cache of the batch
+    assert [results[i].expanded for i in (2, 3)] == [0, 0]
+    assert results[0].length == results[2].length
+    # Nothing is left enabled in this process
+    assert leg_cache.get_leg_cache() is None
+    assert _worker == {}
+    assert all(result.expanded > 0 for _, result in route_many(pairs[:2], 'a_star', G, workers=1))
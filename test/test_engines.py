@@ -0,0 +1,117 @@
+"""
+Tests of the shortest path engines against `nx.dijkstra_path_length` on a
+synthetic grid (see `benchmark.make_grid_graph`), no dataset needed.
+"""
+import random
+
+import networkx as nx
+import pytest
+
+from benchmark import make_grid_graph
+from search import astar_search, bidirectional_astar_search, path_length
+from multi_leg import multi_leg_search
+
+# `G.node` of networkx < 2.4, used by the graph compilation
+requires_node_view = pytest.mark.skipif(not hasattr(nx.Graph, 'node'), reason='networkx without G.node')
+
+
+@pytest.fixture(scope='module')
+def grid():
+    """A 12 x 12 grid with some edges missing, so a few pairs have no route"""
+    return make_grid_graph(12, seed=3, edge_ratio=0.75)
+
+
+def random_pairs(G, number_of_pairs=40, seed=0):
+    rnd = random.Random(seed)
+    nodes = sorted(G.nodes)
+    return [tuple(rnd.sample(nodes, 2)) for _ in range(number_of_pairs)]
+
+
+def reference_length(G, source, target):
+    """Return the Dijkstra length from `source` to `target`, None if there is no path"""
+    try:
+        return nx.dijkstra_path_length(G, source, target, weight='length')
+    except nx.NetworkXNoPath:
+        return None
+
+
+def assert_route(G, path, length, source, target, expected_length):
+    """Check that `path` walks the edges of `G` from `source` to `target` and has the shortest length"""
+    assert path[0] == source and path[-1] == target
+    for u, v in zip(path, path[1:]):
+        assert G.has_edge(u, v)
+    assert length == pytest.approx(expected_length)
+    assert path_length(G, path) == pytest.approx(expected_length)
+
+
+@pytest.mark.parametrize('search', [astar_search, bidirectional_astar_search])
+def test_searches(grid, search):
+    for source, target in random_pairs(grid):
+        expected_length = reference_length(grid, source, target)
+        if expected_length is None:
+            with pytest.raises(nx.NetworkXNoPath):
+                search(grid, source, target)
+            continue
+        path, length, expanded = search(grid, source, target)
+        assert_route(grid, path, length, source, target, expected_length)
+        assert expanded > 0
+
+
+def test_multi_leg(grid):
+    component = max(nx.connected_components(grid), key=len)
+    rnd = random.Random(1)
+    for number_of_waypoints in range(2, 8):
+        waypoints = rnd.sample(sorted(component), number_of_waypoints)
+        full_path, length, expanded, legs = multi_leg_search(grid, waypoints)
+        expected_lengths = [reference_length(grid, u, v) for u, v in zip(waypoints, waypoints[1:])]
+        assert len(legs) == number_of_waypoints - 1
+        for leg, u, v, expected_length in zip(legs, waypoints, waypoints[1:], expected_lengths):
+            assert (leg['start'], leg['end']) == (u, v)
+            assert leg['length'] == pytest.approx(expected_length)
+        assert_route(grid, full_path, length, waypoints[0], waypoints[-1], sum(expected_lengths))
+        assert expanded == sum(leg['expanded'] for leg in legs)
+
+
+def test_contraction_hierarchy(grid, tmp_path):
+    from contraction_hierarchy import ContractionHierarchy
+    built = ContractionHierarchy.build(grid)
+    built.save(str(tmp_path))
+    # The shortcuts are unpacked the same way from the saved arrays
+    for hierarchy in (built, ContractionHierarchy.load(str(tmp_path))):
+        for source, target in random_pairs(grid):
+            i, j = hierarchy.node_index[source], hierarchy.node_index[target]
+            expected_length = reference_length(grid, source, target)
+            if expected_length is None:
+                with pytest.raises(nx.NetworkXNoPath):
+                    hierarchy.query(i, j)
+                continue
+            path, length, _ = hierarchy.query(i, j)
+            assert_route(grid, [hierarchy.node_key(node) for node in path], length, source, target, expected_length)
+
+
+@requires_node_view
+def test_csr_a_star(grid):
+    from compiled_graph import CompiledGraph
+    from csr_a_star import CSRAStar
+    compiled = CompiledGraph.from_graph(grid)
+    engine = CSRAStar(compiled)
+    for source, target in random_pairs(grid):
+        expected_length = reference_length(grid, source, target)
+        i, j = compiled.node_index(source), compiled.node_index(target)
+        if expected_length is None:
+            with pytest.raises(nx.NetworkXNoPath):
+                engine.search(i, j)
+            continue
+        path, length, _ = engine.search(i, j)
+        assert_route(grid, [compiled.node_key(node) for node in path], length, source, target, expected_length)
+
+
+def test_alt(grid):
+    from alt import ALTTables
+    heuristic = ALTTables.build(grid, number_of_references=4).heuristic()
+    for source, target in random_pairs(grid):
+        expected_length = reference_length(grid, source, target)
+        if expected_length is None:
+            continue
+        path, length, _ = astar_search(grid, source, target, heuristic=heuristic)
+        assert_route(grid, path, length, source, target, expected_length)
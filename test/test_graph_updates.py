@@ -0,0 +1,235 @@
+"""
+Tests of the incremental graph updates, `graph_updates.apply_updates`: the
+derived data and the cached legs that are kept must still give the
+`nx.dijkstra_path_length` lengths of the updated graph.
+"""
+import random
+
+import networkx as nx
+import pytest
+
+from alt import get_alt_tables
+from benchmark import make_grid_graph
+from graph_index import graph_signature
+from graph_updates import apply_updates, close_edges, open_edges, set_edge_lengths, set_landmarks
+from landmark_matrix import get_landmark_matrix
+from leg_cache import LegCache, graph_key
+from search import astar_search, shortest_path_search
+from utils import calculate_distance
+
+# `G.node` of networkx < 2.4, used to set the landmark flags and compile the graph
+requires_node_view = pytest.mark.skipif(not hasattr(nx.Graph, 'node'), reason='networkx without G.node')
+
+
+@pytest.fixture
+def grid():
+    """A 10 x 10 grid, changed by the tests"""
+    return make_grid_graph(10, seed=5, landmark_ratio=0.1, edge_ratio=0.9)
+
+
+def random_pairs(G, number_of_pairs=30, seed=0):
+    component = sorted(max(nx.connected_components(G), key=len))
+    rnd = random.Random(seed)
+    return [tuple(rnd.sample(component, 2)) for _ in range(number_of_pairs)]
+
+
+def reference_length(G, source, target):
+    """Return the Dijkstra length from `source` to `target`, None if there is no path"""
+    try:
+        return nx.dijkstra_path_length(G, source, target, weight='length')
+    except nx.NetworkXNoPath:
+        return None
+
+
+def route_length(G, source, target, **kwargs):
+    """Return the length of the leg from `source` to `target`, None if there is no path"""
+    try:
+        return shortest_path_search(G, source, target, **kwargs)[1]
+    except nx.NetworkXNoPath:
+        return None
+
+
+def leg_edge(G, source, target):
+    """Return an edge in the middle of the shortest path from `source` to `target`"""
+    path = nx.dijkstra_path(G, source, target, weight='length')
+    middle = len(path) // 2
+    return path[middle - 1], path[middle]
+
+
+def test_invalid_updates_change_nothing(grid):
+    leg_cache = LegCache()
+    source, target = random_pairs(grid, 1)[0]
+    shortest_path_search(grid, source, target, leg_cache=leg_cache)
+    u, v = leg_edge(grid, source, target)
+    far = max(grid.nodes)
+    number_of_edges = grid.number_of_edges()
+    length = grid[u][v]['length']
+
+    with pytest.raises(KeyError):
+        close_edges(grid, [(u, v), (u, far)], leg_cache=leg_cache)
+    with pytest.raises(KeyError):
+        open_edges(grid, [(u, v)], leg_cache=leg_cache)
+    with pytest.raises(KeyError):
+        apply_updates(grid, closed_edges=[(u, v)], edge_lengths={(u, v): 1.0}, leg_cache=leg_cache)
+    with pytest.raises(ValueError):
+        set_edge_lengths(grid, {(u, v): -1.0}, leg_cache=leg_cache)
+    with pytest.raises(KeyError):
+        set_landmarks(grid, {(-1.0, -1.0): 1}, leg_cache=leg_cache)
+
+    assert grid.has_edge(u, v) and grid[u][v]['length'] == length
+    assert grid.number_of_edges() == number_of_edges
+    assert not grid.graph.get('closed_edges')
+    assert graph_signature(grid) == 0
+    assert leg_cache.get(leg_cache.key(grid, source, target)) is not None
+
+
+def test_closed_and_reopened_edges(grid):
+    leg_cache = LegCache()
+    pairs = random_pairs(grid)
+    u, v = leg_edge(grid, *pairs[0])
+    length = grid[u][v]['length']
+    for source, target in pairs:
+        route_length(grid, source, target, leg_cache=leg_cache)
+
+    close_edges(grid, [(u, v)], leg_cache=leg_cache)
+    assert not grid.has_edge(u, v)
+    for source, target in pairs:
+        assert route_length(grid, source, target, leg_cache=leg_cache) == pytest.approx(
+            reference_length(grid, source, target))
+
+    open_edges(grid, [(v, u)], leg_cache=leg_cache)
+    assert grid[u][v]['length'] == length
+    assert not grid.graph['closed_edges']
+    for source, target in pairs:
+        assert route_length(grid, source, target, leg_cache=leg_cache) == pytest.approx(
+            reference_length(grid, source, target))
+
+
+def test_alt_tables(grid):
+    tables = get_alt_tables(grid, number_of_references=4)
+    pairs = random_pairs(grid)
+    u, v = leg_edge(grid, *pairs[0])
+
+    # Distances only grow, the tables are kept
+    assert 'alt' not in set_edge_lengths(grid, {(u, v): grid[u][v]['length'] * 3})
+    assert 'alt' not in close_edges(grid, [(u, v)])
+    assert get_alt_tables(grid) is tables
+    for source, target in pairs:
+        expected_length = reference_length(grid, source, target)
+        if expected_length is not None:
+            assert astar_search(grid, source, target, heuristic=tables.heuristic())[1] == pytest.approx(
+                expected_length)
+
+    assert 'alt' in open_edges(grid, [(u, v)])
+    tables = get_alt_tables(grid, number_of_references=4)
+    assert 'alt' in set_edge_lengths(grid, {(u, v): grid[u][v]['length'] / 3})
+    assert get_alt_tables(grid, number_of_references=4) is not tables
+
+
+def test_contraction_hierarchy_dropped(grid):
+    grid.graph['contraction_hierarchy'] = (graph_signature(grid), object())
+    u, v = next(iter(grid.edges))
+    assert apply_updates(grid) == []
+    assert 'contraction_hierarchy' in set_edge_lengths(grid, {(u, v): grid[u][v]['length'] * 2})
+    assert 'contraction_hierarchy' not in grid.graph
+
+
+def test_landmark_matrix_edges(grid):
+    matrix = get_landmark_matrix(grid)
+    on_path = next((u, v) for u, v in grid.edges if matrix.uses_edge(u, v))
+    off_path = next((u, v) for u, v in grid.edges if not matrix.uses_edge(u, v))
+
+    assert 'landmark_matrix' not in set_edge_lengths(grid, {off_path: grid.edges[off_path]['length'] * 2})
+    assert get_landmark_matrix(grid) is matrix
+    assert 'landmark_matrix' in set_edge_lengths(grid, {on_path: grid.edges[on_path]['length'] * 2})
+    matrix = get_landmark_matrix(grid)
+    assert 'landmark_matrix' in set_edge_lengths(grid, {off_path: grid.edges[off_path]['length'] / 2})
+    matrix = get_landmark_matrix(grid)
+    for u in matrix.landmark_index:
+        for v in matrix.landmark_index:
+            expected_length = reference_length(grid, u, v)
+            if u != v and expected_length is not None:
+                assert matrix.landmark_leg(u, v)[1] == pytest.approx(expected_length, rel=1e-6)
+
+
+@requires_node_view
+def test_landmark_flags(grid):
+    from graph_index import get_graph_index
+    get_landmark_matrix(grid)
+    node = next(node for node, flag in grid.nodes(data='landmark') if not flag)
+    assert 'landmark_matrix' in set_landmarks(grid, {node: 1})
+    assert grid.nodes[node]['landmark'] == 1
+    assert node in get_graph_index(grid).landmark_nodes
+    assert node in get_landmark_matrix(grid).landmark_index
+
+
+def test_leg_cache(grid):
+    leg_cache = LegCache()
+    pairs = random_pairs(grid)
+    for source, target in pairs:
+        shortest_path_search(grid, source, target, leg_cache=leg_cache)
+    u, v = leg_edge(grid, *pairs[0])
+    legs = {pair: leg_cache.get(leg_cache.key(grid, *pair)) for pair in pairs}
+    old_graph_key = graph_key(grid)
+
+    set_edge_lengths(grid, {(u, v): grid[u][v]['length'] * 2}, leg_cache=leg_cache)
+    assert graph_key(grid) != old_graph_key
+    assert all(key[:2] == graph_key(grid) for key in leg_cache._entries)
+    for pair, (path, length) in legs.items():
+        kept = leg_cache.get(leg_cache.key(grid, *pair))
+        uses_edge = any({a, b} == {u, v} for a, b in zip(path, path[1:]))
+        # Only the legs through the longer edge are removed, the others are moved to the new version
+        assert (kept is None) == uses_edge
+        if kept is not None:
+            assert kept == (path, length)
+    assert legs[pairs[0]] is not None and leg_cache.get(leg_cache.key(grid, *pairs[0])) is None
+
+
+def test_random_updates(grid):
+    """Kept legs and ALT tables still give the shortest lengths after a series of random updates"""
+    leg_cache = LegCache()
+    get_alt_tables(grid, number_of_references=4)
+    pairs = random_pairs(grid)
+    rnd = random.Random(2)
+    for _ in range(20):
+        edges = sorted(grid.edges)
+        closed = sorted(grid.graph.get('closed_edges', {}))
+        edge = rnd.choice(edges)
+        change = rnd.choice(['close', 'open', 'longer', 'shorter'])
+        if change == 'close':
+            close_edges(grid, [edge], leg_cache=leg_cache)
+        elif change == 'open' and closed:
+            open_edges(grid, [rnd.choice(closed)], leg_cache=leg_cache)
+        elif change == 'longer':
+            set_edge_lengths(grid, {edge: grid.edges[edge]['length'] * 1.5}, leg_cache=leg_cache)
+        else:
+            # Not shorter than the straight line, the Euclidean heuristic stays admissible
+            length = max(grid.edges[edge]['length'] / 1.5, calculate_distance(*edge))
+            set_edge_lengths(grid, {edge: length}, leg_cache=leg_cache)
+        heuristic = get_alt_tables(grid, number_of_references=4).heuristic()
+        for source, target in pairs:
+            expected_length = reference_length(grid, source, target)
+            assert route_length(grid, source, target, leg_cache=leg_cache) == pytest.approx(expected_length)
+            if expected_length is not None:
+                assert astar_search(grid, source, target, heuristic=heuristic)[1] == pytest.approx(expected_length)
+
+
+@requires_node_view
+def test_csr_a_star_weights(grid):
+    from csr_a_star import get_engine
+    engine = get_engine(grid)
+    pairs = random_pairs(grid)
+    u, v = leg_edge(grid, *pairs[0])
+    w, x = leg_edge(grid, *pairs[1])
+    close_edges(grid, [(u, v)])
+    set_edge_lengths(grid, {(w, x): grid[w][x]['length'] * 2})
+    assert get_engine(grid) is engine
+    compiled = engine.compiled
+    for source, target in pairs:
+        expected_length = reference_length(grid, source, target)
+        if expected_length is None:
+            with pytest.raises(nx.NetworkXNoPath):
+                engine.search(compiled.node_index(source), compiled.node_index(target))
+            continue
+        path, length, _ = engine.search(compiled.node_index(source), compiled.node_index(target))
+        assert length == pytest.approx(expected_length)
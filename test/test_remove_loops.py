@@ -0,0 +1,142 @@
+"""
+Tests of the loop removal of the landmark routes, `utils.remove_loops`,
+against the cleanup it replaced in `a_star_landmark`.
+"""
+import os
+import random
+import shutil
+
+import networkx as nx
+import pytest
+
+from utils import remove_loops
+
+TEST_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'input')
+
+
+def old_remove_loops(full_path):
+    """The cleanup of `a_star_landmark.shortest_path_a_star` before `remove_loops`"""
+    unduplicate_path = []
+    skip = False
+    current_node = None
+    for node in full_path:
+        if not skip:
+            if full_path.count(node) == 1:
+                # Always add node with single occurence
+                unduplicate_path.append(node)
+            else:
+                # Add the first node that has more than one occurence
+                unduplicate_path.append(node)
+                # Mark skip as true for the next nodes
+                skip = True
+                # Store the first duplicate node
+                current_node = node
+        else:
+            if node == current_node:
+                # Found another current_node
+                # Remove the skip flag
+                skip = False
+                current_node = None
+            else:
+                # Always skip until found another current_node
+                pass
+    return unduplicate_path
+
+
+def detour_path(rnd, length=30, detours=4, max_detour=6):
+    """Return a continuous path of `length` nodes with `detours` loops, each node visited at most twice.
+
+        A detour leaves a node of the path and comes back to it, either around
+        a cycle of new nodes or back along the same new nodes.
+    """
+    path = list(range(length))
+    next_node = length
+    for position in sorted(rnd.sample(range(length), detours), reverse=True):
+        node = path[position]
+        loop = list(range(next_node, next_node + rnd.randint(1, max_detour)))
+        next_node += len(loop)
+        if rnd.random() < 0.5:
+            # Back along the same nodes, the turning node is visited once
+            loop = loop + loop[-2::-1]
+        path[position + 1:position + 1] = loop + [node]
+    return path
+
+
+def assert_clean(path, clean_path):
+    """Check that `clean_path` is loop-free, and walks the edges of `path` from its first to its last node"""
+    assert len(clean_path) == len(set(clean_path))
+    assert clean_path[0] == path[0] and clean_path[-1] == path[-1]
+    edges = set(zip(path, path[1:]))
+    for a, b in zip(clean_path, clean_path[1:]):
+        assert (a, b) in edges
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_same_as_old_cleanup(seed):
+    rnd = random.Random(seed)
+    path = detour_path(rnd, length=rnd.randint(2, 40), detours=rnd.randint(1, 2))
+    clean_path = remove_loops(path)
+    assert clean_path == old_remove_loops(path)
+    assert_clean(path, clean_path)
+
+
+def test_path_without_loop():
+    path = list(range(10))
+    assert remove_loops(path) == path == old_remove_loops(path)
+    assert remove_loops([]) == []
+
+
+def test_nested_loops():
+    path = [0, 1, 2, 3, 2, 4, 1, 5]
+    assert remove_loops(path) == old_remove_loops(path) == [0, 1, 5]
+
+
+def test_repeated_visits():
+    # The old cleanup kept the third visit of 1 and dropped 6 after the overlapping loops
+    path = [0, 1, 2, 1, 3, 1, 4]
+    assert remove_loops(path) == [0, 1, 4]
+    assert_clean(path, remove_loops(path))
+    path = [0, 1, 2, 3, 1, 3, 6]
+    assert remove_loops(path) == [0, 1, 3, 6]
+    assert_clean(path, remove_loops(path))
+
+
+@pytest.fixture(scope='module')
+def test_graph(tmp_path_factory):
+    """Graph of a copy of the test network, so nothing is written next to the test data"""
+    pytest.importorskip('osgeo')
+    if not hasattr(nx, 'read_shp'):
+        pytest.skip('networkx without read_shp')
+    from graph_store import load_graph
+    copy_path = str(tmp_path_factory.mktemp('routing') / 'input')
+    shutil.copytree(TEST_INPUT, copy_path)
+    return load_graph(copy_path)
+
+
+def test_landmark_route(test_graph, monkeypatch):
+    import a_star_landmark
+    G = test_graph
+    full_paths = []
+
+    def recording_remove_loops(full_path):
+        full_paths.append(list(full_path))
+        return remove_loops(full_path)
+
+    monkeypatch.setattr(a_star_landmark, 'remove_loops', recording_remove_loops)
+    node_ids = sorted(value for _, value in G.nodes(data='nodeID') if value is not None)
+    rnd = random.Random(0)
+    for _ in range(20):
+        start_id, end_id = rnd.sample(node_ids, 2)
+        del full_paths[:]
+        try:
+            result = a_star_landmark.shortest_path_a_star(('nodeID', start_id), ('nodeID', end_id), G, None)
+        except nx.NetworkXNoPath:
+            continue
+        path = result.path
+        assert G.node[path[0]]['nodeID'] == start_id and G.node[path[-1]]['nodeID'] == end_id
+        assert len(path) == len(set(path))
+        for a, b in zip(path, path[1:]):
+            assert G.has_edge(a, b)
+        if full_paths:
+            # The route had loops, cleaned the same way as before
+            assert path == old_remove_loops(full_paths[0])
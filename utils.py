@@ -7,7 +7,12 @@ Utilities functions for A* algorithm.
 """
 
 import json
-from osgeo import ogr, osr
+import logging
+import sys
+
+# Parent logger of the routing modules, quiet (WARNING) unless configured
+LOGGER_NAME = 'routing'
+_verbose_handler = None
 
 def get_nodes(G, key, value):
     """Return list of nodes that has attribute key = value"""
@@ -45,8 +50,25 @@ def nodes_from_path(G, path, key=''):
         keys = [G.node[node][key] for node in path]
         return keys
 
+def remove_loops(path):
+    """Helper to remove the detours (loops) from a continuous `path` in one pass.
+
+        A node visited more than once is kept once, and the nodes between its
+        first and last visit are skipped.
+    """
+    # Last position of each node in the path
+    last_positions = {node: i for i, node in enumerate(path)}
+    clean_path = []
+    i = 0
+    while i < len(path):
+        node = path[i]
+        clean_path.append(node)
+        i = last_positions[node] + 1
+    return clean_path
+
 def get_spatial_reference(path):
     """Helper to get spatial reference from a path of layer"""
+    from osgeo import ogr
     layers = ogr.Open(path)
     if layers is None:
         raise RuntimeError("Unable to open {}".format(path))
@@ -58,6 +80,7 @@ def get_spatial_reference(path):
 
 def create_path_layer(G, path, output_file, spatial_reference):
     """Helper to create layer from a path"""
+    from osgeo import ogr
     # Create geometry from the edges
     print('Create geometry')
     # set up the shapefile driver
@@ -128,6 +151,45 @@ def get_points(G, edge_key):
     json_edge = json.loads(json_string_edge)
     return json_edge['coordinates']
 
+def get_logger(name):
+    """Helper to get the logger of the module `name`, a child of the `routing` logger"""
+    return logging.getLogger('%s.%s' % (LOGGER_NAME, name))
+
+def enable_verbose_output(level=logging.DEBUG, stream=None):
+    """Helper to print the routing log messages (the per query details are DEBUG),
+        like the console output of the research runs.
+    """
+    global _verbose_handler
+    logger = logging.getLogger(LOGGER_NAME)
+    if _verbose_handler is None:
+        _verbose_handler = logging.StreamHandler(stream or sys.stdout)
+        _verbose_handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(_verbose_handler)
+    logger.setLevel(level)
+
+def disable_verbose_output():
+    """Helper to go back to the quiet default of the routing log messages"""
+    global _verbose_handler
+    logger = logging.getLogger(LOGGER_NAME)
+    if _verbose_handler is not None:
+        logger.removeHandler(_verbose_handler)
+        _verbose_handler = None
+    logger.setLevel(logging.NOTSET)
+
+def log_graph_summary(logger, graph):
+    """Log the summary of a `graph` at DEBUG level, counting the edges only if it is logged"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Summary of Graph:')
+        logger.debug('Number of nodes in G: %s', graph.number_of_nodes())
+        logger.debug('Number of edges in G: %s', graph.number_of_edges())
+
+def log_node(logger, graph, node):
+    """Log `node` from `graph` with the attribute at DEBUG level"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Key: %s', pretty_node(node))
+        for k, v in graph.node[node].items():
+            logger.debug('\t%s: %s', k, v)
+
 def graph_summary(graph):
     """Print the summary of a `graph`"""
     print('Summary of Graph:')
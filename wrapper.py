@@ -5,92 +5,103 @@ Wrapper script to get path from a point with an algorithm
     Email       : imajimatika@gmail.com
     Date        : Jun 2019
 """
-from osgeo import ogr, osr
 import os
-import networkx as nx
 
-from qgis.core import QgsApplication, QgsVectorLayer, QgsPointXY, QgsGeometry, QgsFeature
-from utils import get_points, get_spatial_reference
-from qgis_utils import get_nearest_feature
+from utils import get_spatial_reference, get_logger, enable_verbose_output
+from graph_store import get_graph, get_source_path, load_graph
+from snapping import KDTreeSnapper, get_node_snapper
+from route_geometry import path_coordinates, linestring_geometry
+from instrumentation import get_metrics, phase
+from algorithms import get_algorithm
 
-from a_star import shortest_path_a_star as a_star_algorithm
-from a_star_landmark import shortest_path_a_star as a_star_landmark_algorithm
+logger = get_logger(__name__)
 
-def algorithm_wrapper(start_point, end_point, node_layer, input_data_path, output_file, algorithm, node_id_attribute='nodeID'):
+def algorithm_wrapper(start_point, end_point, node_layer, input_data_path, output_file, algorithm, node_id_attribute='nodeID', writer=None, route_id=None):
     """
         `start_point` : the starting point as QgsPointXY
         `end_point` : the end point as QgsPointXY
         `node_layer` : a point vector layer that contains the node. Naturally it's located in input_data_path
-        `input_data_path` : a path to directory with nodes and edges layer.
+            Use a `LayerSnapper` of the layer to build its spatial index only once,
+            or a `snapping.KDTreeSnapper` (or None for the one of the graph) to snap without QGIS.
+        `input_data_path` : a path to directory with nodes and edges layer,
+            or a graph loaded with `graph_store.load_graph`.
         `output_file` : a path to the output shape file.
+        `algorithm` : the routing function or its name, see `algorithms.ALGORITHMS`.
+        `writer` : a `route_writer.RouteWriter` to write the route as its feature
+            `route_id` instead of creating the shape file `output_file`.
+
+        Return the `RouteResult` of the `algorithm`.
     """
+    algorithm = get_algorithm(algorithm)
+    metrics = get_metrics()
+
+    # Read graph (only once per dataset), shared with the `algorithm`
+    G = get_graph(input_data_path)
+
     # Get the nearest node from start and end
-    start_node = get_nearest_feature(node_layer, start_point)
-    print('start nodeID:', start_node['nodeID'])
-    end_node = get_nearest_feature(node_layer, end_point)
-    print('end nodeID:', end_node['nodeID'])
-    
-    # generate path with the `algorithm`
-    start_node_id = (node_id_attribute, start_node['nodeID'])
-    end_node_id = (node_id_attribute, end_node['nodeID'])
-    path = algorithm(start_node_id, end_node_id, input_data_path, output_file)
-
-    # Sort the path
-    coordinates = [start_point]
-    G = nx.Graph(nx.read_shp(input_data_path, strict=False, geom_attrs=True)) # Read and convert to Graph
-    for i in range(len(path) - 1):
-        node1 = path[i]
-        node2 = path[i+1]
-        edge_key = [node1, node2]
-        # print('edge key: ', edge_key)
-        points = get_points(G, edge_key)
-        # print(points)
-        if i == 0:
-            for p in points:
-                coordinates.append(QgsPointXY(p[0], p[1]))
+    with phase(metrics, 'snapping'):
+        if node_layer is None:
+            node_layer = get_node_snapper(G, node_id_attribute)
+        if isinstance(node_layer, KDTreeSnapper):
+            start_node_value, end_node_value = node_layer.nearest_node_ids(
+                [(start_point.x(), start_point.y()), (end_point.x(), end_point.y())])
         else:
-            start_point_path = QgsPointXY(points[0][0], points[0][1])
-            if start_point_path == coordinates[-1]:
-                # Same end point, add a usual
-                for p in points[1:]:
-                    coordinates.append(QgsPointXY(p[0], p[1]))
-            else:
-                # Different endpoint, reverse
-                for p in points[::-1][1:]:
-                    coordinates.append(QgsPointXY(p[0], p[1]))
-    # Append end point
-    coordinates.append(end_point)
-    
-    # Spatial reference
-    spatial_reference = get_spatial_reference(input_data_path)
-
-    # Write result to a shapefile (TODO: put it in a function)
-    # Create geometry for the whole line
-    line_geometry = QgsGeometry.fromPolylineXY(coordinates)
-    # Convert to Wkt for ogr
-    line_wkt = line_geometry.asWkt()
-    # set up the shapefile driver
-    driver = ogr.GetDriverByName("ESRI Shapefile")
-    # create the data source
-    data_source = driver.CreateDataSource(output_file)
-    # create the layer
-    layer = data_source.CreateLayer("A Star Shortest Path", spatial_reference, ogr.wkbLineString)
-    feature = ogr.Feature(layer.GetLayerDefn())
-    geom = ogr.CreateGeometryFromWkt(line_wkt)
-    # Set the feature geometry using the geom
-    feature.SetGeometry(geom)
-    # Create the feature in the layer (shapefile)
-    layer.CreateFeature(feature)
-    # Dereference the feature
-    feature = None
-    data_source = None
-
-    print(output_file)
+            # QGIS is only needed to snap with a layer
+            from qgis_utils import get_nearest_feature
+            start_node_value = get_nearest_feature(node_layer, start_point)['nodeID']
+            end_node_value = get_nearest_feature(node_layer, end_point)['nodeID']
+    logger.debug('start nodeID: %s', start_node_value)
+    logger.debug('end nodeID: %s', end_node_value)
+
+    # generate path with the `algorithm`
+    start_node_id = (node_id_attribute, start_node_value)
+    end_node_id = (node_id_attribute, end_node_value)
+    result = algorithm(start_node_id, end_node_id, G, output_file)
+    path = result.path
+
+    # Line of the path, from the start point to the end point
+    with phase(metrics, 'geometry'):
+        coordinates = path_coordinates(G, path, (start_point.x(), start_point.y()), (end_point.x(), end_point.y()))
+
+    if writer is not None:
+        with phase(metrics, 'output_write'):
+            writer.write(route_id, result, coordinates=coordinates)
+        return result
+
+    with phase(metrics, 'output_write'):
+        from osgeo import ogr
+        # Spatial reference
+        spatial_reference = get_spatial_reference(get_source_path(input_data_path))
+
+        # Write result to a shapefile (TODO: put it in a function)
+        # set up the shapefile driver
+        driver = ogr.GetDriverByName("ESRI Shapefile")
+        # create the data source
+        data_source = driver.CreateDataSource(output_file)
+        # create the layer
+        layer = data_source.CreateLayer("A Star Shortest Path", spatial_reference, ogr.wkbLineString)
+        feature = ogr.Feature(layer.GetLayerDefn())
+        # Create geometry for the whole line
+        geom = linestring_geometry(coordinates)
+        # Set the feature geometry using the geom
+        feature.SetGeometry(geom)
+        # Create the feature in the layer (shapefile)
+        layer.CreateFeature(feature)
+        # Dereference the feature
+        feature = None
+        data_source = None
+
+    logger.debug('%s', output_file)
+    return result
 
 
 if __name__ == "__main__":
     from qgis.core import QgsApplication, QgsVectorLayer, QgsPointXY
+    from qgis_utils import LayerSnapper
     
+    # Research run, print the details of every query
+    enable_verbose_output()
+
     QgsApplication.setPrefixPath('/usr', True)
     qgs = QgsApplication([], False)
     qgs.initQgis()
@@ -114,8 +125,8 @@ if __name__ == "__main__":
     ]
 
     algorithms = [
-        a_star_algorithm,
-        a_star_landmark_algorithm
+        'a_star',
+        'a_star_landmark',
     ]
 
     # Test
@@ -127,14 +138,18 @@ if __name__ == "__main__":
     node_layer = QgsVectorLayer(node_path, 'nodes', 'ogr')
     if not node_layer.isValid():
         print('Node layer is not valid.')
+    # Build the spatial index once for all routes and algorithms
+    node_snapper = LayerSnapper(node_layer)
     
     input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/topic_data'
     # input_data_path = '/home/ismailsunni/Documents/GeoTech/Routing/processed/small_data'
+    # Read the graph once for all routes and algorithms
+    G = load_graph(input_data_path)
 
     base_output_file =  '/home/ismailsunni/dev/python/routing/test/output/route_landmark_survey'
     output_file = os.path.join(base_output_file, 'landmark_wrapper_A.shp')
 
     for route in routes:
         for algorithm in algorithms:
-            output_file = os.path.join(base_output_file, algorithm.name + '_' + route[0] + '.shp')
-            algorithm_wrapper(route[1], route[2], node_layer, input_data_path, output_file, algorithm)        
\ No newline at end of file
+            output_file = os.path.join(base_output_file, algorithm + '_' + route[0] + '.shp')
+            algorithm_wrapper(route[1], route[2], node_snapper, G, output_file, algorithm)        
\ No newline at end of file